@@ -1,5 +1,7 @@
 
 import os
+import sys
+from map_renderer import RegionFile
 
 
 # NOTE: standard python usually implies 'zstandard' library which might need install.
@@ -13,36 +15,45 @@ except ImportError:
     print("zstandard library not found. Cannot decompress.")
     exit(1)
 
-file_path = "/home/thiago/Documentos/HyPrism/data/packs/Teste/saves/New World/universe/worlds/flat_world/chunks/0.0.region.bin"
+# Region file to inspect, e.g. data/packs/<pack>/saves/<save>/universe/worlds/<world>/chunks/0.0.region.bin
+# (or a synthetic one from experiments/synthetic_world.py)
+file_path = sys.argv[1] if len(sys.argv) > 1 else "0.0.region.bin"
 
 def analyze_header():
     if not os.path.exists(file_path):
         print(f"File not found: {file_path}")
         return
 
-    with open(file_path, "rb") as f:
-        data = f.read(20000) # Read 20KB to ensure we get the full chunk header
-    
-    # Zstd Magic: 28 B5 2F FD
-    zstd_sig = b'\x28\xb5\x2f\xfd'
-    offset_zstd = data.find(zstd_sig)
-    
-    if offset_zstd != -1:
-         print(f"Found ZSTD signature at offset {offset_zstd}")
-         try:
-             dctx = zstd.ZstdDecompressor()
-             # decompressed = dctx.decompress(data[offset_zstd:], max_output_size=100000) 
-             # stream reader is safer for partial data
-             reader = dctx.stream_reader(data[offset_zstd:])
-             decompressed = reader.read(256)
-             
-             print(f"Decompression successful!")
-             print(f"Hex Start: {decompressed[:32].hex(' ')}")
-             print(f"Text Start: {decompressed[:100]}")
-         except Exception as e:
-             print(f"Decompression failed: {e}")
-    else:
-         print("No ZSTD signature found in first 20KB for this attempt.")
+    with RegionFile(file_path) as region:
+        offsets = region.offsets
+        if offsets is None:
+            print("Offset table truncated.")
+            return
+
+        # Zstd Magic: 28 B5 2F FD (checked by chunk_frame, including the +8 variant)
+        frame = None
+        for grid_idx, sector in enumerate(offsets):
+            if not sector: continue
+            frame = region.chunk_frame(grid_idx)
+            if frame is not None: break
+
+        if frame is not None:
+             print(f"Found ZSTD frame for chunk {grid_idx} at offset {region.size - len(frame)}")
+             try:
+                 dctx = zstd.ZstdDecompressor()
+                 # stream reader is safer for partial data
+                 with dctx.stream_reader(frame) as reader:
+                     decompressed = reader.read(256)
+
+                 print(f"Decompression successful!")
+                 print(f"Hex Start: {decompressed[:32].hex(' ')}")
+                 print(f"Text Start: {decompressed[:100]}")
+             except Exception as e:
+                 print(f"Decompression failed: {e}")
+             finally:
+                 frame.release()
+        else:
+             print("No ZSTD frame found in the offset table.")
 
 if __name__ == "__main__":
     analyze_header()
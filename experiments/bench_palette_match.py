@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from map_renderer import CompiledPalette, block_priority, title_case_key, FALLBACK_COLOR
+
+PALETTE_SIZES = [500, 2000, 10000]
+CHUNKS = 20
+CHUNK_SIZE = 32 * 1024
+WORDS = ["rock", "stone", "soil", "grass", "dirt", "sand", "water", "wood", "oak", "leaves",
+         "ore", "iron", "copper", "snow", "clay", "basalt", "plant", "flower", "mossy", "top", "side"]
+
+def nested_in_loop(cdata, palette, palette_keys_encoded):
+    """The renderer's original lookup: one `in` scan per key and case variant"""
+    best_color = None
+    best_priority = -1
+    matched_blocks = []
+    for key_name, encoded_key in palette_keys_encoded.items():
+        if encoded_key in cdata:
+            palette_key = key_name.replace('_title', '') if '_title' in key_name else key_name
+            if palette_key in matched_blocks:
+                continue
+            matched_blocks.append(palette_key)
+            color_val = palette[palette_key]
+            if best_color is None:
+                best_color = color_val
+            priority = block_priority(palette_key)
+            if priority > best_priority:
+                best_priority = priority
+                best_color = color_val
+    return best_color if best_color else FALLBACK_COLOR
+
+def make_palette(rnd, size):
+    palette = {}
+    while len(palette) < size:
+        name = '_'.join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 3))) + f"_{len(palette)}"
+        palette[name] = (rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(0, 255))
+    return palette
+
+def make_chunk(rnd, palette_keys):
+    # Mostly binary noise with a handful of Title_Case block names, like a real chunk
+    data = bytearray(os.urandom(CHUNK_SIZE))
+    for _ in range(rnd.randint(1, 12)):
+        name = title_case_key(rnd.choice(palette_keys)).encode('utf-8')
+        pos = rnd.randrange(0, CHUNK_SIZE - len(name))
+        data[pos:pos + len(name)] = name
+    return bytes(data)
+
+def bench():
+    rnd = random.Random(42)
+    print(f"{'palette':>8} {'nested in (ms/chunk)':>22} {'automaton (ms/chunk)':>22} {'build (ms)':>11} {'speedup':>8}")
+    for size in PALETTE_SIZES:
+        palette = make_palette(rnd, size)
+        keys = list(palette.keys())
+        chunks = [make_chunk(rnd, keys) for _ in range(CHUNKS)]
+
+        encoded = {}
+        for k in keys:
+            encoded[k] = k.encode('utf-8')
+            encoded[k + '_title'] = title_case_key(k).encode('utf-8')
+
+        start = time.perf_counter()
+        expected = [nested_in_loop(c, palette, encoded) for c in chunks]
+        t_loop = (time.perf_counter() - start) / CHUNKS
+
+        start = time.perf_counter()
+        matcher = CompiledPalette(palette).matcher
+        t_build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        got = [matcher.classify(c)[0] for c in chunks]
+        t_match = (time.perf_counter() - start) / CHUNKS
+
+        if got != expected:
+            print(f"MISMATCH for palette size {size}")
+        print(f"{size:>8} {t_loop * 1000:>22.2f} {t_match * 1000:>22.2f} {t_build * 1000:>11.1f} {t_loop / t_match:>7.1f}x")
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,180 @@
+"""Map rendering benchmark on a synthetic world (see synthetic_world.py).
+
+Reports chunks/s, decompressed MB/s and peak RSS for:
+  core  - render_region over every region in this process (decode + classify only)
+  cold  - ModManager.generate_world_map with an empty tile cache (worker pool, tiles, PNG)
+  warm  - the same render again, served from the tile cache
+
+Also counts how the core run classified chunks: decoded as BSON, or through the fallback
+raw scan (and how many chunks hit map_renderer.CHUNK_READ_LIMIT). Synthetic chunks are
+written to the parser's assumed layout, so they always decode; pass --chunks with the
+chunks folder of a real save (and --palette) to see what real data does. That measures
+the core run only.
+
+Usage: python experiments/bench_render.py [--size 6] [--density 0.6] [--vocab 12] [--workers 0] [--json]
+       python experiments/bench_render.py --chunks SAVE/universe/worlds/default/chunks --palette data/block_colors.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import zstandard as zstd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import map_renderer
+from synthetic_world import make_world, make_vocabulary, make_palette
+
+PACK = "Bench"
+SAVE = "World"
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of the largest child (ru_maxrss is in KB on Linux)"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+def measure_input(chunks_dir):
+    """Chunk count, bytes the renderer decompresses and chunks cut off by read_chunk's cap"""
+    dctx = zstd.ZstdDecompressor()
+    chunks = 0
+    raw = 0
+    truncated = 0
+    for name in region_names(chunks_dir):
+        with map_renderer.RegionFile(os.path.join(chunks_dir, name)) as region:
+            for grid_idx in range(len(region.offsets or [])):
+                data = region.read_chunk(grid_idx, dctx)
+                if data is None: continue
+                chunks += 1
+                raw += len(data)
+                if len(data) >= map_renderer.CHUNK_READ_LIMIT: truncated += 1
+    return chunks, raw, truncated
+
+
+def region_names(chunks_dir):
+    return [n for n in os.listdir(chunks_dir) if n.endswith(".region.bin")]
+
+
+def bench_core(chunks_dir, palette_path):
+    classifier = map_renderer.ChunkClassifier(map_renderer.load_compiled_palette(palette_path))
+    start = time.perf_counter()
+    for name in region_names(chunks_dir):
+        rx, rz = (int(p) for p in name.split('.')[:2])
+        map_renderer.render_region(rx, rz, os.path.join(chunks_dir, name), classifier)
+    return time.perf_counter() - start, classifier
+
+
+def bench_full(manager):
+    start = time.perf_counter()
+    res = manager.generate_world_map(PACK, SAVE)
+    elapsed = time.perf_counter() - start
+    if res.get('status') != 'success':
+        raise RuntimeError(f"generate_world_map failed: {res.get('message')}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the map renderer on a synthetic world")
+    parser.add_argument("--size", type=int, default=6, help="regions per side (default 6)")
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument("--vocab", type=int, default=12, help="distinct block names in the world")
+    parser.add_argument("--sections", type=int, default=10, help="max sections per chunk")
+    parser.add_argument("--workers", type=int, default=0, help="map_workers for cold/warm runs (0 = auto)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-full", action="store_true", help="only run the in-process core benchmark")
+    parser.add_argument("--json", action="store_true", help="print one JSON object (for CI comparisons)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated world")
+    parser.add_argument("--chunks", help="benchmark this existing chunks folder (e.g. a real save) instead of a synthetic world")
+    parser.add_argument("--palette", help="block_colors.json to use with --chunks")
+    args = parser.parse_args()
+    if args.chunks and not args.palette:
+        parser.error("--chunks needs --palette")
+
+    workdir = tempfile.mkdtemp(prefix="map_bench_")
+    cwd = os.getcwd()
+    try:
+        data_dir = os.path.join(workdir, "data")
+        save_dir = os.path.join(data_dir, "packs", PACK, "saves", SAVE)
+        vocabulary = make_vocabulary(args.vocab, args.seed)
+        palette_path = os.path.join(data_dir, "block_colors.json")
+
+        start = time.perf_counter()
+        if args.chunks:
+            chunks_dir, palette_path = args.chunks, args.palette
+        else:
+            chunks_dir, _ = make_world(save_dir, args.size, args.density, vocabulary, args.seed, args.sections)
+            with open(palette_path, 'w') as f:
+                json.dump(make_palette(vocabulary, args.seed), f)
+        gen_time = time.perf_counter() - start
+
+        chunks, raw, truncated = measure_input(chunks_dir)
+        compressed = sum(os.path.getsize(os.path.join(chunks_dir, n)) for n in region_names(chunks_dir))
+        results = {
+            "source": args.chunks or "synthetic",
+            "regions": len(region_names(chunks_dir)),
+            "chunks": chunks,
+            "decompressed_mb": raw / 1e6,
+            "region_files_mb": compressed / 1e6,
+            "generate_s": gen_time,
+            "runs": {}
+        }
+
+        def record(label, elapsed):
+            results["runs"][label] = {
+                "seconds": elapsed,
+                "chunks_per_s": chunks / elapsed,
+                "mb_per_s": raw / 1e6 / elapsed,
+            }
+
+        elapsed, classifier = bench_core(chunks_dir, palette_path)
+        record("core", elapsed)
+        results["decode"] = {
+            "bson": classifier.decoded,
+            "fallback": classifier.scanned,
+            "truncated": truncated
+        }
+
+        if not args.skip_full and not args.chunks:
+            # ModManager works relative to the current directory (data/, map_gen.log)
+            os.chdir(workdir)
+            from mod_manager import ModManager
+            manager = ModManager()
+            manager.config["map_workers"] = args.workers
+            record("cold", bench_full(manager))
+            record("warm", bench_full(manager))
+
+        own, children = peak_rss_mb()
+        results["peak_rss_mb"] = own
+        results["peak_rss_workers_mb"] = children
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"World kept at {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results))
+        return
+
+    generated = "" if args.chunks else f", generated in {gen_time:.1f}s"
+    print(f"{results['regions']} regions ({results['source']}), {chunks} chunks, {raw / 1e6:.1f} MB decompressed "
+          f"({compressed / 1e6:.1f} MB on disk{generated})")
+    decode = results["decode"]
+    print(f"chunks decoded as BSON: {decode['bson']}, fallback scan: {decode['fallback']} "
+          f"({decode['truncated']} cut at {map_renderer.CHUNK_READ_LIMIT // 1024} KiB)")
+    print(f"{'run':>6} {'seconds':>9} {'chunks/s':>10} {'MB/s':>8}")
+    for label, run in results["runs"].items():
+        print(f"{label:>6} {run['seconds']:>9.2f} {run['chunks_per_s']:>10.0f} {run['mb_per_s']:>8.1f}")
+    print(f"peak RSS: {results['peak_rss_mb']:.0f} MB (largest worker {results['peak_rss_workers_mb']:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
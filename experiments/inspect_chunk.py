@@ -1,12 +1,18 @@
 
 import zstandard as zstd
 import os
+import sys
 
-REGION_FILE = "/home/thiago/Documentos/HyPrism/data/packs/Teste/saves/New World/universe/worlds/flat_world/chunks/0.0.region.bin"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from map_renderer import parse_chunk_block_names
+
+# Region file to inspect, e.g. data/packs/<pack>/saves/<save>/universe/worlds/<world>/chunks/0.0.region.bin
+# (or a synthetic one from experiments/synthetic_world.py)
+REGION_FILE = sys.argv[1] if len(sys.argv) > 1 else "0.0.region.bin"
 
 def inspect_chunk():
     if not os.path.exists(REGION_FILE):
-        print("Region file not found")
+        print(f"Region file not found: {REGION_FILE} (usage: {sys.argv[0]} <file.region.bin>)")
         return
 
     with open(REGION_FILE, 'rb') as f:
@@ -29,6 +35,13 @@ def inspect_chunk():
         import re
         strings = re.findall(b'[a-zA-Z0-9_]{3,}', decompressed[:2000])
         print(f"Strings found: {strings[:20]}")
+
+        # Structured decode (BSON document + section palettes)
+        names = parse_chunk_block_names(decompressed)
+        if names is None:
+            print("Chunk did not decode as a BSON document")
+        else:
+            print(f"Block names ({len(names)}): {sorted(names)}")
         
     except Exception as e:
         print(f"Decompression error: {e}")
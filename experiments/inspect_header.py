@@ -1,45 +1,53 @@
-
-import struct
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from map_renderer import RegionFile, REGION_TABLE_OFFSET, SECTOR_SIZE
 
-REGION_FILE = "/home/thiago/Documentos/HyPrism/data/packs/Teste/saves/New World/universe/worlds/flat_world/chunks/0.0.region.bin"
+# Region file to inspect, e.g. data/packs/<pack>/saves/<save>/universe/worlds/<world>/chunks/0.0.region.bin
+# (or a synthetic one from experiments/synthetic_world.py)
+REGION_FILE = sys.argv[1] if len(sys.argv) > 1 else "0.0.region.bin"
 
 def inspect_header():
     if not os.path.exists(REGION_FILE):
-        print("Region file not found")
+        print(f"Region file not found: {REGION_FILE} (usage: {sys.argv[0]} <file.region.bin>)")
         return
 
-    with open(REGION_FILE, 'rb') as f:
+    with RegionFile(REGION_FILE) as region:
+        header = region.header
         # Signature 20 bytes
-        sig = f.read(20)
-        print(f"Signature: {sig}")
-        
+        print(f"Signature: {header[:20]}")
+
         # Maybe version?
-        version = f.read(4)
-        print(f"Version/Unknown at 20: {version.hex()}") # 00000001?
-        
-        # Table of 1024 entries? (32x32)
-        # Each entry maybe 4 bytes (offset) + 4 bytes (size)? or just offset?
-        # If chunks are packed, offset is enough? Or maybe size and offset.
-        # Let's read 1024 * 4 bytes first.
-        
-        table_data = f.read(1024 * 4)
-        offsets = struct.unpack(f'>{1024}I', table_data)
-        
+        print(f"Version/Unknown at 20: {header[20:24].hex()}") # 00000001?
+        print(f"Remaining header bytes: {header[24:].hex()}")
+
+        # Table of 1024 entries (32x32), one big-endian sector index per chunk
+        offsets = region.offsets
+        if offsets is None:
+            print("Offset table truncated")
+            return
+
         print("First 16 offsets:")
         for i in range(16):
             print(f"Chunk {i}: {offsets[i]}")
-            
+
         print("...")
-        
-        # Calculate possible start of data
-        current_pos = f.tell()
-        print(f"Current File Position (end of table): {current_pos}")
-        
-        # If header ends here, it should be around 4120. (20 + 4 + 4096 = 4120)
+        print(f"Non-empty chunks: {sum(1 for o in offsets if o)}")
+
+        # Sector 0 starts at the table, so data begins at the first used sector
+        end_of_table = REGION_TABLE_OFFSET + 1024 * 4
+        print(f"Current File Position (end of table): {end_of_table}")
+        used = [o for o in offsets if o]
+        if used:
+            first = REGION_TABLE_OFFSET + min(used) * SECTOR_SIZE
+            print(f"First chunk sector at byte {first}")
+
         # Inspect a bit more
-        more = f.read(32)
-        print(f"Bytes after table: {more.hex()}")
+        frame = region.chunk_frame(next((i for i, o in enumerate(offsets) if o), 0))
+        if frame is not None:
+            print(f"First frame bytes: {frame[:32].hex()}")
+            frame.release()
 
 if __name__ == "__main__":
     inspect_header()
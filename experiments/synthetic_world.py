@@ -0,0 +1,166 @@
+"""Writes synthetic worlds in the layout generate_world_map reads, so the renderer can be
+tested and benchmarked without a real save.
+
+Region files: 40-byte header ("HytaleIndexedStorage" + padding), a 1024-entry big-endian
+sector table at byte 40, then zstd frames starting at 40 + sector * 4096. Each chunk is a
+BSON document whose BlockChunk sections carry a palette of u16-length-prefixed block names,
+which is what map_renderer.parse_chunk_block_names decodes.
+
+The chunk layout is modelled on the parser's assumptions, not checked against real saves,
+and sections are far smaller than real ones (4096 blocks), so every chunk stays under
+map_renderer.CHUNK_READ_LIMIT and decodes. Rendering numbers from these worlds say nothing
+about how often real chunks take the fallback scan; see bench_render.py --chunks.
+
+Usage: python experiments/synthetic_world.py OUT_DIR [--size 4] [--density 0.6] [--vocab 12]
+"""
+import os
+import sys
+import json
+import struct
+import random
+import argparse
+import zstandard as zstd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from map_renderer import REGION_TABLE_OFFSET, SECTOR_SIZE, REGION_CHUNKS
+
+SIGNATURE = b"HytaleIndexedStorage"
+DEFAULT_BLOCKS = [
+    "Rock_Stone", "Rock_Bedrock", "Rock_Basalt", "Soil_Grass", "Soil_Dirt", "Sand_White",
+    "Water_Source", "Wood_Oak_Trunk", "Plant_Leaves_Oak", "Ore_Iron_Basalt", "Snow_Block", "Empty"
+]
+WORDS = ["Rock", "Stone", "Soil", "Grass", "Dirt", "Sand", "Water", "Wood", "Oak", "Leaves",
+         "Ore", "Iron", "Copper", "Snow", "Clay", "Basalt", "Plant", "Flower", "Mossy"]
+
+
+def make_vocabulary(size, seed=0):
+    """DEFAULT_BLOCKS, padded with generated Title_Case names up to `size` entries"""
+    if size <= len(DEFAULT_BLOCKS):
+        return DEFAULT_BLOCKS[:size]
+    rnd = random.Random(seed)
+    names = list(DEFAULT_BLOCKS)
+    while len(names) < size:
+        names.append('_'.join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 3))) + f"_{len(names)}")
+    return names
+
+
+def make_palette(vocabulary, seed=0):
+    """block_colors.json content for a vocabulary (lowercase keys, like the real palette)"""
+    rnd = random.Random(seed)
+    return {name.lower(): [rnd.randint(0, 255) for _ in range(3)] for name in vocabulary if name != "Empty"}
+
+
+def _cstr(s):
+    return s.encode('ascii') + b"\0"
+
+
+def _doc(elements):
+    body = b"".join(elements) + b"\0"
+    return struct.pack('<i', len(body) + 4) + body
+
+
+def _int(key, value):
+    return b"\x10" + _cstr(key) + struct.pack('<i', value)
+
+
+def _string(key, value):
+    raw = value.encode('ascii') + b"\0"
+    return b"\x02" + _cstr(key) + struct.pack('<i', len(raw)) + raw
+
+
+def _sub(key, doc, array=False):
+    return (b"\x04" if array else b"\x03") + _cstr(key) + doc
+
+
+def _binary(key, blob):
+    return b"\x05" + _cstr(key) + struct.pack('<i', len(blob)) + b"\0" + blob
+
+
+def make_section(rnd, vocabulary, blocks=4096):
+    """One section blob: palette (count, then index + name + count per entry) and block indices"""
+    palette = rnd.sample(vocabulary, min(len(vocabulary), rnd.randint(1, 6)))
+    blob = bytearray(b"\x01" + struct.pack('>h', len(palette)))
+    for i, name in enumerate(palette):
+        raw = name.encode('ascii')
+        blob += struct.pack('>h', i) + struct.pack('>H', len(raw)) + raw + struct.pack('>h', blocks // len(palette))
+    # Block data: palette indices only, so it can't be mistaken for a name
+    table = bytes(i % len(palette) for i in range(256))
+    blob += rnd.randbytes(blocks).translate(table)
+    return bytes(blob)
+
+
+def make_chunk(rnd, vocabulary, x, z, max_sections=10):
+    """A complete BSON chunk document"""
+    sections = _doc([_binary(str(i), make_section(rnd, vocabulary)) for i in range(rnd.randint(1, max_sections))])
+    components = _doc([
+        _sub("BlockChunk", _doc([_sub("Sections", sections, array=True)])),
+        _sub("EntityChunk", _doc([_string("0", "Npc_Kweebec")]), array=True),
+    ])
+    return _doc([_int("Version", 3), _sub("Components", components), _int("X", x), _int("Z", z)])
+
+
+def write_region(path, rx, rz, rnd, vocabulary, density=0.6, max_sections=10, cctx=None):
+    """Writes one region file; returns the number of chunks stored"""
+    cctx = cctx or zstd.ZstdCompressor()
+    table = [0] * (REGION_CHUNKS * REGION_CHUNKS)
+    body = bytearray()
+    sector = 1 # sector 0 holds the table itself
+    for grid_idx in range(len(table)):
+        if rnd.random() >= density: continue
+        x = rx * REGION_CHUNKS + grid_idx % REGION_CHUNKS
+        z = rz * REGION_CHUNKS + grid_idx // REGION_CHUNKS
+        frame = cctx.compress(make_chunk(rnd, vocabulary, x, z, max_sections))
+        table[grid_idx] = sector
+        body += b"\0" * ((sector - 1) * SECTOR_SIZE - len(body))
+        body += frame
+        sector += -(-len(frame) // SECTOR_SIZE)
+
+    # Signature, then a big-endian 1 where real saves carry what looks like a version
+    header = SIGNATURE + struct.pack('>I', 1)
+    header += b"\0" * (REGION_TABLE_OFFSET - len(header))
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(struct.pack(f'>{len(table)}I', *table))
+        f.write(body)
+    return sum(1 for s in table if s)
+
+
+def make_world(save_dir, size=4, density=0.6, vocabulary=None, seed=0, max_sections=10):
+    """Writes a size x size region world into save_dir/universe/worlds/default/chunks,
+    centered on region 0.0. Returns (chunks_dir, chunk_count)."""
+    vocabulary = vocabulary or DEFAULT_BLOCKS
+    chunks_dir = os.path.join(save_dir, "universe", "worlds", "default", "chunks")
+    os.makedirs(chunks_dir, exist_ok=True)
+    rnd = random.Random(seed)
+    cctx = zstd.ZstdCompressor()
+    lo = -(size // 2)
+    count = 0
+    for rz in range(lo, lo + size):
+        for rx in range(lo, lo + size):
+            path = os.path.join(chunks_dir, f"{rx}.{rz}.region.bin")
+            count += write_region(path, rx, rz, rnd, vocabulary, density, max_sections, cctx)
+    return chunks_dir, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Hytale world for map rendering tests")
+    parser.add_argument("out", help="save folder to create (universe/worlds/... goes inside)")
+    parser.add_argument("--size", type=int, default=4, help="regions per side (default 4)")
+    parser.add_argument("--density", type=float, default=0.6, help="fraction of chunks present (default 0.6)")
+    parser.add_argument("--vocab", type=int, default=len(DEFAULT_BLOCKS), help="number of distinct block names")
+    parser.add_argument("--sections", type=int, default=10, help="max sections per chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--palette", help="also write a block_colors.json for the vocabulary here")
+    args = parser.parse_args()
+
+    vocabulary = make_vocabulary(args.vocab, args.seed)
+    chunks_dir, count = make_world(args.out, args.size, args.density, vocabulary, args.seed, args.sections)
+    print(f"Wrote {args.size * args.size} regions ({count} chunks) to {chunks_dir}")
+    if args.palette:
+        with open(args.palette, 'w') as f:
+            json.dump(make_palette(vocabulary, args.seed), f, indent=2)
+        print(f"Wrote palette to {args.palette}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import webview
 import os
 from urllib.parse import unquote
 import sys
@@ -6,16 +5,21 @@ import threading
 import socket
 import webbrowser
 import json
+import time
+import base64
+import multiprocessing
 from http.server import HTTPServer, SimpleHTTPRequestHandler
-import tkinter as tk
-from tkinter import filedialog
-from mod_manager import ModManager
+
+# GUI toolkits and ModManager are imported where they're used: with the spawn start method
+# (Windows, frozen builds) every map worker re-imports this module, and workers only need
+# map_renderer.
 
 CURRENT_VERSION = "1.0.0"
 REPO_URL = "https://api.github.com/repos/ThiagoMPSS-dot/NEXCore/releases/latest"
 
 class Api:
     def __init__(self):
+        from mod_manager import ModManager
         self.manager = ModManager()
         self.window = None
 
@@ -106,9 +110,24 @@ class Api:
     def delete_mods_from_library_py(self, mod_ids):
         return self.manager.delete_mods_from_library(mod_ids)
 
+    def check_mod_updates_py(self):
+        return self.manager.check_mod_updates()
+
+    def update_mods_py(self, mod_ids):
+        return self.manager.update_mods(mod_ids)
+
+    def get_mod_usage_py(self, mod_id):
+        return self.manager.get_mod_usage(mod_id)
+
+    def resolve_internal_ids_py(self, internal_ids):
+        return self.manager.resolve_internal_ids(internal_ids)
+
     def remove_mods_from_pack_py(self, pack, mod_ids):
         return self.manager.remove_mods_from_pack(pack, mod_ids)
 
+    def export_metadata_py(self):
+        return self.manager.export_metadata()
+
     def fetch_mod_metadata_py(self, mod_id):
         return self.manager.fetch_mod_metadata(mod_id)
 
@@ -130,6 +149,15 @@ class Api:
     def get_saves_for_pack_py(self, pack_name):
         return self.manager.get_saves_for_pack(pack_name)
 
+    def list_save_snapshots_py(self, pack_name):
+        return self.manager.list_save_snapshots(pack_name)
+
+    def create_save_snapshot_py(self, pack_name, label=""):
+        return self.manager.create_save_snapshot(pack_name, label)
+
+    def restore_save_snapshot_py(self, pack_name, snap_id):
+        return self.manager.restore_save_snapshot(pack_name, snap_id)
+
     def create_save_py(self, pack_name, config):
         return self.manager.create_save(pack_name, config)
 
@@ -146,6 +174,8 @@ class Api:
         return self.manager.delete_save(pack_name, folder_name)
 
     def export_modpack_cf_py(self, pack_name):
+        import tkinter as tk
+        from tkinter import filedialog
         root = tk.Tk()
         root.withdraw()
         root.attributes('-topmost', True)
@@ -168,6 +198,8 @@ class Api:
         return self.manager.export_modpack_cf(pack_name, target_path, progress_callback=progress)
 
     def import_modpack_cf_py(self):
+        import tkinter as tk
+        from tkinter import filedialog
         root = tk.Tk()
         root.withdraw()
         root.attributes('-topmost', True)
@@ -209,7 +241,11 @@ class Api:
             return {"status": "up_to_date"} # Fail silently to not bug the user
 
     def generate_map_py(self, pack_name, save_name):
-        res = self.manager.generate_world_map(pack_name, save_name)
+        def progress(msg):
+            if self.window:
+                self.window.evaluate_js(f"if(window.updateProgress) window.updateProgress({json.dumps(msg)})")
+
+        res = self.manager.generate_world_map(pack_name, save_name, progress_callback=progress)
         if res['status'] == 'success':
             # Convert absolute path to local server URL
             # The server serves root_dir which is CWD.
@@ -225,9 +261,93 @@ class Api:
             # So we just need to return a URL that matches this pattern.
             # The file generated is 'map_preview.png'.
             # So URL: /save-preview/{pack_name}/{save_name}/map_preview.png
-            return {"status": "success", "url": f"/save-preview/{pack_name}/{save_name}/map_preview.png"}
+            result = {"status": "success", "url": f"/save-preview/{pack_name}/{save_name}/map_preview.png"}
+            if res.get('tiles'):
+                # Zoomable tile pyramid metadata; tiles are served by the /map-tiles/ handler
+                result["tiles"] = res['tiles']
+            return result
         return res
 
+    def start_map_py(self, pack_name, save_name):
+        """Background map render; finished regions are pushed to window.onMapJobEvent as they complete"""
+        pending_tiles = []
+        last_flush = [0.0]
+        progress = {"done": 0, "total": 0, "message": None}
+
+        def push(event):
+            if self.window:
+                self.window.evaluate_js(f"if(window.onMapJobEvent) window.onMapJobEvent({json.dumps(event)})")
+
+        def flush(job_id):
+            if pending_tiles:
+                push({
+                    "type": "tiles",
+                    "job_id": job_id,
+                    "tiles": list(pending_tiles),
+                    "done": progress["done"],
+                    "total": progress["total"],
+                    "percent": int(progress["done"] * 100 / max(1, progress["total"])),
+                    "message": progress["message"]
+                })
+                pending_tiles.clear()
+            elif progress["message"]:
+                push({"type": "progress", "job_id": job_id, "message": progress["message"]})
+            progress["message"] = None
+            last_flush[0] = time.time()
+
+        def on_event(event):
+            # Tiles and progress text are batched so the webview bridge isn't flooded
+            # (about 5 pushes per second); the latest text rides along with the tiles
+            if event["type"] == "tile":
+                progress["done"], progress["total"] = event["done"], event["total"]
+                if event["tile"] is not None:
+                    pending_tiles.append([event["rx"], event["rz"], base64.b64encode(event["tile"]).decode('ascii')])
+                if time.time() - last_flush[0] > 0.2:
+                    flush(event["job_id"])
+                return
+            if event["type"] == "progress":
+                progress["message"] = event["message"]
+                # Per-region messages while tiles stream are throttled; the phases around
+                # them (palette, pyramid) are rare and shown right away
+                streaming = 0 < progress["done"] < progress["total"]
+                if not streaming or time.time() - last_flush[0] > 0.2:
+                    flush(event["job_id"])
+                return
+
+            flush(event["job_id"])
+            if event["type"] == "done":
+                res = event["result"]
+                event["result"] = {
+                    "url": f"/save-preview/{pack_name}/{save_name}/map_preview.png",
+                    "tiles": res.get("tiles")
+                }
+            push(event)
+
+        return self.manager.start_map_job(pack_name, save_name, on_event)
+
+    def cancel_map_py(self, job_id):
+        return self.manager.cancel_map_job(job_id)
+
+    def start_map_batch_py(self, force=False):
+        """Re-renders every outdated save map; progress goes to window.onMapBatchEvent"""
+        last_push = [0.0]
+
+        def on_event(event):
+            # Progress fires per region: throttle it like the tile stream
+            if event["type"] == "progress":
+                if time.time() - last_push[0] < 0.2: return
+                last_push[0] = time.time()
+            if self.window:
+                self.window.evaluate_js(f"if(window.onMapBatchEvent) window.onMapBatchEvent({json.dumps(event)})")
+
+        return self.manager.start_map_batch(on_event, force=force)
+
+    def build_palette_py(self, force=False):
+        def progress(msg):
+            if self.window:
+                self.window.evaluate_js(f"if(window.updateProgress) window.updateProgress({json.dumps(msg)})")
+        return self.manager.build_block_palette(force=force, progress_callback=progress)
+
 def find_free_port():
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.bind(('', 0))
@@ -287,6 +407,39 @@ def start_server(port, root_dir):
                     self.send_error(400, "Invalid path")
                 return
 
+            if self.path.startswith('/map-tiles/'):
+                # Format: /map-tiles/PackName/FolderName/tiles.json or /map-tiles/PackName/FolderName/z/x/y.png
+                parts = self.path.split('?')[0].split('/')
+                if len(parts) < 5:
+                    self.send_error(400, "Invalid path")
+                    return
+
+                # Security: No parent directory traversal
+                pack_name = os.path.basename(unquote(parts[2]))
+                folder_name = os.path.basename(unquote(parts[3]))
+                rest = parts[4:]
+
+                tiles_dir = os.path.join(os.getcwd(), "data", "map_cache", pack_name, folder_name, "tiles")
+                if rest == ["tiles.json"]:
+                    file_path = os.path.join(tiles_dir, "tiles.json")
+                    content_type = 'application/json'
+                elif len(rest) == 3 and rest[2].endswith('.png') and all(p.lstrip('-').isdigit() for p in (rest[0], rest[1], rest[2][:-4])):
+                    file_path = os.path.join(tiles_dir, rest[0], rest[1], rest[2])
+                    content_type = 'image/png'
+                else:
+                    self.send_error(400, "Invalid path")
+                    return
+
+                if os.path.exists(file_path):
+                    self.send_response(200)
+                    self.send_header('Content-type', content_type)
+                    self.end_headers()
+                    with open(file_path, 'rb') as f:
+                        self.wfile.write(f.read())
+                else:
+                    self.send_error(404, "Tile not found")
+                return
+
             if self.path.startswith('/screenshots/'):
                 # Extract filename
                 filename = self.path.replace('/screenshots/', '')
@@ -321,6 +474,7 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 def start_app():
+    import webview
     api = Api()
     
     # Setup Paths (PyInstaller compatible)
@@ -360,4 +514,6 @@ def start_app():
     webview.start(debug=False, icon=icon_path, gui=gui_backend)
 
 if __name__ == '__main__':
+    # Required for the map renderer process pool in PyInstaller builds
+    multiprocessing.freeze_support()
     start_app()
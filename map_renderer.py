@@ -0,0 +1,1054 @@
+import os
+import re
+import json
+import time
+import zipfile
+import mmap
+import struct
+import hashlib
+import zlib
+import logging
+from array import array
+from collections import deque
+
+# NOTE: This module is imported by the map worker processes, so it must stay
+# free of import-time side effects (mod_manager configures file logging on import).
+logger = logging.getLogger("MapGen")
+
+try:
+    import zstandard as zstd
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Region file layout
+REGION_TABLE_OFFSET = 40
+SECTOR_SIZE = 4096
+REGION_CHUNKS = 32 # Regions are 32x32 chunks
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# Decompressed bytes read per chunk; longer chunks arrive truncated and take the raw scan
+CHUNK_READ_LIMIT = 64 * 1024
+
+# Bump whenever render_region output changes, so cached tiles get redone
+TILE_FORMAT_VERSION = 1
+TILE_BYTES = REGION_CHUNKS * REGION_CHUNKS * 4
+
+# Where block textures live inside Assets.zip (e.g. Common/BlockTextures/Grass_Top.png)
+BLOCK_TEXTURE_PREFIX = "Common/BlockTextures/"
+
+# Slippy-map pyramid: the deepest zoom is 1 pixel per chunk
+PYRAMID_TILE_SIZE = 256
+REGIONS_PER_TILE = PYRAMID_TILE_SIZE // REGION_CHUNKS
+
+BACKGROUND_COLOR = (20, 20, 25)
+FALLBACK_COLOR = (60, 60, 65)
+
+# Block priorities for "Top-Down" view (higher = more visible)
+PRIORITIES = {
+    "water": 100, "lava": 99, "snow": 90,
+    "grass": 85, "vegetation": 84, "flower": 83,
+    "sand": 75, "gravel": 74,
+    "leaves": 65, "tree": 64,
+    "log": 55, "wood": 54,
+    "ore": 45,
+    "dirt": 35, "soil": 34,
+    "clay": 25,
+    "rock": 15, "stone": 12, "volcanic": 11,
+    "bedrock": 1
+}
+
+# Identifier runs inside binary section blobs (same heuristic as experiments/inspect_chunk.py)
+_NAME_RUN = re.compile(rb'[A-Za-z0-9_]{3,}')
+
+# Fixed-size BSON element payloads (type byte -> size)
+_BSON_FIXED = {0x01: 8, 0x07: 12, 0x08: 1, 0x09: 8, 0x0A: 0, 0x10: 4, 0x11: 8, 0x12: 8, 0x13: 16, 0x7F: 0, 0xFF: 0}
+
+# Worker process state (set once per process by init_worker)
+_worker_classifier = None
+
+
+def block_priority(palette_key):
+    """Top-down visibility of a palette entry (first matching PRIORITIES keyword, else 20)"""
+    for key, p_val in PRIORITIES.items():
+        if key in palette_key:
+            return p_val
+    return 20
+
+
+def _scan_section_names(data, pos, end, names):
+    """Collects the block palette of a binary section blob (data[pos:end]).
+    Palette entries are Java-style UTF strings: u16 big-endian length + bytes."""
+    for m in _NAME_RUN.finditer(data, pos, end):
+        start = m.start()
+        if start - 2 < pos: continue
+        length = (data[start - 2] << 8) | data[start - 1]
+        if 3 <= length <= m.end() - start:
+            names.add(data[start:start + length].decode('ascii'))
+
+
+def _walk_bson(data, pos, end, names, depth=0):
+    """Walks one BSON document, adding string values and section palette names to `names`.
+    Raises ValueError on anything that isn't well-formed BSON."""
+    if depth > 32: raise ValueError("BSON nesting too deep")
+    while pos < end:
+        etype = data[pos]
+        pos += 1
+        if etype == 0x00:
+            return pos
+        # Element name (cstring)
+        nul = data.index(b'\x00', pos, end)
+        pos = nul + 1
+
+        if etype in _BSON_FIXED:
+            pos += _BSON_FIXED[etype]
+        elif etype in (0x02, 0x0D, 0x0E): # string, js code, symbol
+            (slen,) = struct.unpack_from('<i', data, pos)
+            if slen < 1 or pos + 4 + slen > end: raise ValueError("Bad BSON string")
+            if _NAME_RUN.fullmatch(data, pos + 4, pos + 3 + slen):
+                names.add(data[pos + 4:pos + 3 + slen].decode('ascii'))
+            pos += 4 + slen
+        elif etype in (0x03, 0x04): # document, array
+            (dlen,) = struct.unpack_from('<i', data, pos)
+            if dlen < 5 or pos + dlen > end: raise ValueError("Bad BSON document")
+            _walk_bson(data, pos + 4, pos + dlen, names, depth + 1)
+            pos += dlen
+        elif etype == 0x05: # binary: block sections live here
+            (blen,) = struct.unpack_from('<i', data, pos)
+            if blen < 0 or pos + 5 + blen > end: raise ValueError("Bad BSON binary")
+            _scan_section_names(data, pos + 5, pos + 5 + blen, names)
+            pos += 5 + blen
+        elif etype == 0x0B: # regex: two cstrings
+            pos = data.index(b'\x00', pos, end) + 1
+            pos = data.index(b'\x00', pos, end) + 1
+        elif etype == 0x0F: # code with scope
+            (clen,) = struct.unpack_from('<i', data, pos)
+            if clen < 14 or pos + clen > end: raise ValueError("Bad BSON code")
+            pos += clen
+        else:
+            raise ValueError(f"Unknown BSON type 0x{etype:02x}")
+    raise ValueError("BSON document not terminated")
+
+
+def parse_chunk_block_names(cdata):
+    """Decodes a chunk (a BSON document) and returns the set of block names it references.
+    Returns None when the data isn't a complete BSON document (e.g. truncated at the
+    decompression limit), so callers can fall back to the substring scan.
+
+    Assumed layout (no spec, and no real-save fixture checks it): the chunk is one BSON
+    document and block sections are BSON binary values whose palette entries are
+    u16 big-endian length-prefixed names. experiments/synthetic_world.py writes exactly
+    this, so synthetic benchmarks can't confirm it; run experiments/inspect_chunk.py or
+    bench_render.py --chunks on a real save to see how many chunks actually decode."""
+    if len(cdata) < 5: return None
+    (doc_len,) = struct.unpack_from('<i', cdata, 0)
+    if doc_len != len(cdata) or cdata[-1] != 0: return None
+    names = set()
+    try:
+        _walk_bson(cdata, 4, doc_len, names)
+    except (ValueError, IndexError, struct.error):
+        return None
+    return names
+
+
+def title_case_key(key):
+    """Hytale uses Title_Case in chunk data (Rock_Bedrock, Ore_Iron_Basalt)
+    but palette keys are lowercase, so every key is matched in both forms."""
+    return '_'.join(word.capitalize() for word in key.split('_'))
+
+
+class CompiledPalette:
+    """block_colors.json compiled once for rendering.
+
+    Entries are stored in rank order (highest priority first, then palette order), so
+    rank i has priorities[i], colors[i] and its encoded name variants in variants[i];
+    "best color" anywhere in the renderer is just the lowest rank seen. Also owns the
+    PaletteMatcher built from these arrays. Picklable, so it is shipped to the worker
+    processes already built."""
+
+    def __init__(self, palette, fingerprint=None):
+        keys = list(palette.keys())
+        priorities = [block_priority(k) for k in keys]
+        order = sorted(range(len(keys)), key=lambda i: (-priorities[i], i))
+        self.keys = [keys[i] for i in order]
+        self.priorities = array('H', (priorities[i] for i in order))
+        self.colors = [tuple(int(c) for c in palette[keys[i]][:3]) for i in order]
+        self.variants = [(k.encode('utf-8'), title_case_key(k).encode('utf-8')) for k in self.keys]
+        self.fingerprint = fingerprint
+        self.matcher = PaletteMatcher(self)
+        # Block name -> rank, filled lazily by ChunkClassifier.resolve
+        self.resolved_names = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+
+# path -> (size, mtime_ns, CompiledPalette); survives across renders in this process
+_compiled_palettes = {}
+
+
+def load_compiled_palette(palette_path):
+    """Loads and compiles block_colors.json, reusing the last compilation while the
+    file's size and mtime are unchanged. A missing file gives an empty palette."""
+    try:
+        st = os.stat(palette_path)
+        stamp = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        stamp = None
+
+    cached = _compiled_palettes.get(palette_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    palette = {}
+    if stamp is not None:
+        with open(palette_path, 'r') as f:
+            raw_palette = json.load(f)
+            # Ensure all keys are lowercase and values are TUPLES
+            palette = {k.lower(): tuple(v) for k, v in raw_palette.items()}
+    compiled = CompiledPalette(palette, palette_fingerprint(palette_path))
+    _compiled_palettes[palette_path] = (stamp, compiled)
+    return compiled
+
+
+class PaletteMatcher:
+    """Aho-Corasick automaton over every palette key (lowercase and Title_Case).
+
+    Each automaton state stores the best (lowest) rank among the keys ending there.
+    Scanning a chunk is one C-level regex pass that splits it into maximal runs of
+    bytes that occur in some key (every key occurrence lies in one such run); each
+    distinct run then goes through the automaton once and is memoized."""
+
+    MAX_MEMO = 200000
+
+    def __init__(self, compiled):
+        self.colors = compiled.colors
+        self.no_match = len(compiled.keys)
+
+        goto = [{}]
+        best = [self.no_match]
+        alphabet = set()
+        min_len = None
+        for rank, (lower, title) in enumerate(compiled.variants):
+            for pattern in {lower, title}:
+                if not pattern: continue
+                state = 0
+                for b in pattern:
+                    nxt = goto[state].get(b)
+                    if nxt is None:
+                        goto.append({})
+                        best.append(self.no_match)
+                        nxt = len(goto) - 1
+                        goto[state][b] = nxt
+                    state = nxt
+                best[state] = min(best[state], rank)
+                alphabet.update(pattern)
+                min_len = len(pattern) if min_len is None else min(min_len, len(pattern))
+
+        # Failure links (BFS, so a state's fallback is final before its children)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for b, child in goto[state].items():
+                if state:
+                    f = fail[state]
+                    while f and b not in goto[f]:
+                        f = fail[f]
+                    fail[child] = goto[f].get(b, 0)
+                    best[child] = min(best[child], best[fail[child]])
+                queue.append(child)
+
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+        self._runs = None
+        if alphabet:
+            char_class = b''.join(re.escape(bytes([c])) for c in sorted(alphabet))
+            self._runs = re.compile(b'[' + char_class + b']{%d,}' % min_len)
+        self._memo = {}
+
+    def best_rank(self, data):
+        """Lowest (best) rank of any key occurring in data (bytes), no_match if none"""
+        goto, fail, best = self._goto, self._fail, self._best
+        result = self.no_match
+        state = 0
+        for b in data:
+            while state and b not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(b, 0)
+            if best[state] < result:
+                result = best[state]
+        return result
+
+    def classify(self, cdata):
+        """Returns (color, match_count) for raw chunk bytes.
+        match_count is the number of distinct byte runs that hit the palette."""
+        if self._runs is None:
+            return FALLBACK_COLOR, 0
+        memo = self._memo
+        if len(memo) > self.MAX_MEMO:
+            memo.clear()
+        result = self.no_match
+        match_count = 0
+        for run in set(self._runs.findall(cdata)):
+            rank = memo.get(run)
+            if rank is None:
+                rank = memo[run] = self.best_rank(run)
+            if rank < self.no_match:
+                match_count += 1
+                if rank < result:
+                    result = rank
+        return (self.colors[result] if result < self.no_match else FALLBACK_COLOR), match_count
+
+
+class ChunkClassifier:
+    """Picks the top-down color of a chunk.
+
+    Chunks that decode as BSON are classified from their distinct block names, each
+    resolved against the palette once and memoized, so the cost per chunk scales with
+    the number of distinct blocks instead of the palette size. Anything else goes
+    through the PaletteMatcher scan over the raw bytes."""
+
+    def __init__(self, compiled):
+        self.palette = compiled
+        self.matcher = compiled.matcher
+        self._resolved = compiled.resolved_names
+        # Chunks classified by each path (in this process)
+        self.decoded = 0
+        self.scanned = 0
+
+    def resolve(self, name):
+        """Palette rank for a block name (matcher.no_match if nothing matches).
+        Same matching rule as the raw scan: a key matches if its lowercase or
+        Title_Case form occurs in the name."""
+        rank = self._resolved.get(name)
+        if rank is None:
+            rank = self._resolved[name] = self.matcher.best_rank(name.encode('utf-8'))
+        return rank
+
+    def classify(self, cdata):
+        """Returns (color, match_count) for a decompressed chunk"""
+        names = parse_chunk_block_names(cdata)
+        if names is None:
+            self.scanned += 1
+            return self.matcher.classify(cdata)
+        self.decoded += 1
+
+        no_match = self.matcher.no_match
+        result = no_match
+        match_count = 0
+        for name in names:
+            rank = self.resolve(name)
+            if rank < no_match:
+                match_count += 1
+                if rank < result:
+                    result = rank
+        return (self.matcher.colors[result] if result < no_match else FALLBACK_COLOR), match_count
+
+
+class RegionFile:
+    """Read-only, memory-mapped view of a .region.bin file.
+
+    Layout: a 40-byte header, the 1024-entry sector offset table (big-endian u32,
+    row-major over the 32x32 chunk grid) and 4096-byte sectors counted from the
+    table start. Chunk frames are handed out as memoryview slices of the mapping,
+    so nothing is copied until zstd writes the decompressed output."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._mm = None
+        self._view = memoryview(b'')
+        if self.size > 0:
+            with open(path, 'rb') as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mm)
+        self._offsets = None
+        self._span_ends = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._view.release()
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                # A chunk view is still alive somewhere; the mapping is freed with it
+                pass
+            self._mm = None
+
+    @property
+    def header(self):
+        return bytes(self._view[:REGION_TABLE_OFFSET])
+
+    @property
+    def offsets(self):
+        """Sector index of every chunk in the 32x32 grid (0 = not generated).
+        Returns None if the table is truncated."""
+        if self._offsets is None:
+            if self.size < REGION_TABLE_OFFSET + 4096:
+                return None
+            self._offsets = struct.unpack_from('>1024I', self._view, REGION_TABLE_OFFSET)
+        return self._offsets
+
+    def chunk_frame(self, grid_idx):
+        """memoryview starting at the chunk's zstd frame (up to end of file), or None"""
+        offsets = self.offsets
+        if offsets is None: return None
+        block_idx = offsets[grid_idx]
+        if block_idx == 0 or block_idx > 1000000: return None
+
+        # CORRECT FORMULA: Sector 0 starts at byte 40 (Table Start)
+        byte_off = REGION_TABLE_OFFSET + block_idx * SECTOR_SIZE
+        if byte_off >= self.size: return None
+
+        # Verify ZSTD magic before decompressing
+        if self._view[byte_off:byte_off+4] != ZSTD_MAGIC:
+            # Fallback: Maybe it's at the +8 offset some regions have?
+            if byte_off + 8 < self.size and self._view[byte_off+8:byte_off+12] == ZSTD_MAGIC:
+                byte_off += 8
+            else:
+                return None
+        return self._view[byte_off:]
+
+    def chunk_span(self, grid_idx):
+        """memoryview of the sectors a chunk occupies (up to the next chunk's first sector),
+        or None. Unlike chunk_frame it has a definite end, so it can be hashed."""
+        offsets = self.offsets
+        if offsets is None: return None
+        block_idx = offsets[grid_idx]
+        if block_idx == 0 or block_idx > 1000000: return None
+        start = REGION_TABLE_OFFSET + block_idx * SECTOR_SIZE
+        if start >= self.size: return None
+        if self._span_ends is None:
+            starts = sorted({o for o in offsets if 0 < o <= 1000000})
+            self._span_ends = {}
+            for i, o in enumerate(starts):
+                nxt = REGION_TABLE_OFFSET + starts[i + 1] * SECTOR_SIZE if i + 1 < len(starts) else self.size
+                self._span_ends[o] = min(nxt, self.size)
+        return self._view[start:self._span_ends[block_idx]]
+
+    def chunk_hashes(self):
+        """64-bit hash of every chunk's stored bytes, as array('Q') over the grid (0 = no chunk)"""
+        hashes = array('Q', [0]) * (REGION_CHUNKS * REGION_CHUNKS)
+        if self.offsets is None: return hashes
+        for grid_idx in range(len(hashes)):
+            span = self.chunk_span(grid_idx)
+            if span is None: continue
+            try:
+                digest = hashlib.blake2b(span, digest_size=8).digest()
+            finally:
+                span.release()
+            hashes[grid_idx] = int.from_bytes(digest, 'little') or 1
+        return hashes
+
+    def read_chunk(self, grid_idx, dctx, max_size=CHUNK_READ_LIMIT):
+        """Decompresses up to max_size bytes of a chunk straight from the mapping"""
+        frame = self.chunk_frame(grid_idx)
+        if frame is None: return None
+        try:
+            # Zstandard stops at the frame end, so the open-ended view is fine
+            with dctx.stream_reader(frame) as reader:
+                return reader.read(max_size)
+        finally:
+            frame.release()
+
+
+def render_region(rx, rz, rf_path, classifier, previous=None):
+    """Decodes one region file into a 32x32 RGBA tile (row-major by chunk grid index).
+    Alpha is 255 for chunks that exist and 0 for empty cells, so the tile can be pasted
+    over the canvas using itself as mask.
+
+    previous is the (tile, hashes) of the last render of this region with the same palette:
+    chunks whose stored bytes hash the same keep their old color and aren't decompressed.
+    Returns (tile, hashes), or (None, None) if the region is unreadable."""
+    logger.debug(f"Processing region {rx}.{rz}...")
+    tile = bytearray(TILE_BYTES)
+    try:
+        with RegionFile(rf_path) as region:
+            chunk_offsets = region.offsets
+            if chunk_offsets is None:
+                logger.warning(f"Region {rx}.{rz} has truncated header table")
+                return None, None
+
+            hashes = region.chunk_hashes()
+            old_tile, old_hashes = None, None
+            if previous is not None:
+                old_tile = previous[0]
+                old_hashes = array('Q')
+                old_hashes.frombytes(previous[1])
+            reused = 0
+
+            valid_offsets = [o for o in chunk_offsets if 0 < o < 1000000]
+            # Log only if significant
+            if len(valid_offsets) > 0:
+                logger.debug(f"Region {rx}.{rz}: Found {len(valid_offsets)} non-zero chunk offsets")
+
+            dctx = zstd.ZstdDecompressor()
+
+            for grid_idx in range(len(chunk_offsets)):
+                p = grid_idx * 4
+                h = hashes[grid_idx]
+                if old_hashes is not None and h and old_hashes[grid_idx] == h and old_tile[p + 3] == 255:
+                    tile[p:p+4] = old_tile[p:p+4]
+                    reused += 1
+                    continue
+                try:
+                    cdata = region.read_chunk(grid_idx, dctx)
+                    if cdata is None: continue
+
+                    color, match_count = classifier.classify(cdata)
+
+                    # Debug logging para primeiros chunks
+                    if grid_idx % 100 == 0 and grid_idx > 0:
+                        logger.debug(f"Chunk {grid_idx} (Region {rx}.{rz}): Found {match_count} blocks in palette")
+
+                    # Ensure color is a tuple of 3 ints
+                    if not (isinstance(color, (list, tuple)) and len(color) >= 3):
+                        color = FALLBACK_COLOR
+                    # grid_idx is the chunk index within the 32x32 region grid (0-1023),
+                    # row-major: first 32 chunks are row 0, next 32 are row 1, etc.
+                    tile[p:p+4] = bytes((int(color[0]), int(color[1]), int(color[2]), 255))
+                except Exception as e:
+                    if grid_idx == 0: # Only log first error to avoid massive logs if decompression fails
+                        logger.error(f"Decompression error in chunk {grid_idx} of region {rx}.{rz}: {e}")
+            if reused:
+                logger.debug(f"Region {rx}.{rz}: {reused} unchanged chunks reused")
+    except Exception as e:
+        logger.error(f"Error reading region {rx}.{rz}: {e}")
+        return None, None
+
+    return bytes(tile), hashes.tobytes()
+
+
+class MapCanvas:
+    """(H, W, 3) uint8 map image assembled from region tiles.
+
+    Worlds up to max_res chunks per side are drawn at 1 pixel per chunk, each tile
+    assigned as a whole 32x32 block. Bigger worlds are reduced by the smallest power
+    of two that fits, averaging the explored chunks under every output pixel
+    (unexplored ones don't count), instead of dropping to one chunk per region."""
+
+    def __init__(self, width_chunks, height_chunks, max_res=2048, factor=None):
+        self.factor = factor or self.scale_for(width_chunks, height_chunks, max_res)
+        self.width = -(-width_chunks // self.factor)
+        self.height = -(-height_chunks // self.factor)
+        if self.factor == 1:
+            self.pixels = np.empty((self.height, self.width, 3), dtype=np.uint8)
+            self.pixels[:] = BACKGROUND_COLOR
+        else:
+            self._sums = np.zeros((self.height, self.width, 3), dtype=np.uint64)
+            self._counts = np.zeros((self.height, self.width), dtype=np.uint32)
+
+    @staticmethod
+    def scale_for(width_chunks, height_chunks, max_res):
+        """Smallest power-of-two reduction that fits the world in max_res pixels per side"""
+        factor = 1
+        while width_chunks > max_res * factor or height_chunks > max_res * factor:
+            factor *= 2
+        return factor
+
+    def add_tile(self, cx, cz, tile):
+        """Draws a region tile whose north-west chunk is (cx, cz) relative to the canvas origin"""
+        if tile is None: return
+        rgba = np.frombuffer(tile, dtype=np.uint8).reshape(REGION_CHUNKS, REGION_CHUNKS, 4)
+        mask = rgba[:, :, 3] > 0
+        f = self.factor
+        if f == 1:
+            block = self.pixels[cz:cz + REGION_CHUNKS, cx:cx + REGION_CHUNKS]
+            block[mask] = rgba[:, :, :3][mask]
+            return
+
+        rgb = rgba[:, :, :3].astype(np.uint64) * mask[:, :, None]
+        if f <= REGION_CHUNKS:
+            b = REGION_CHUNKS // f
+            sums = rgb.reshape(b, f, b, f, 3).sum(axis=(1, 3))
+            counts = mask.reshape(b, f, b, f).sum(axis=(1, 3))
+            px, pz = cx // f, cz // f
+            self._sums[pz:pz + b, px:px + b] += sums
+            self._counts[pz:pz + b, px:px + b] += counts.astype(np.uint32)
+        else:
+            # Whole region lands in a single output pixel
+            px, pz = cx // f, cz // f
+            self._sums[pz, px] += rgb.sum(axis=(0, 1))
+            self._counts[pz, px] += int(mask.sum())
+
+    def to_array(self):
+        if self.factor == 1:
+            return self.pixels
+        counts = self._counts[:, :, None]
+        mean = (self._sums + counts // 2) // np.maximum(counts, 1)
+        out = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        out[:] = BACKGROUND_COLOR
+        explored = self._counts > 0
+        out[explored] = mean[explored].astype(np.uint8)
+        return out
+
+
+class PNGStreamWriter:
+    """Writes an 8-bit RGB PNG row band by row band, so the image never has to be in memory"""
+
+    def __init__(self, path, width, height):
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self._f = open(path, 'wb')
+        self._z = zlib.compressobj(6)
+        self._f.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self._f.write(struct.pack('>I', len(data)))
+        self._f.write(kind)
+        self._f.write(data)
+        self._f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+    def write_rows(self, rows):
+        """rows: (n, width, 3) uint8"""
+        n = rows.shape[0]
+        # Every scanline starts with its filter type (0 = none)
+        raw = np.zeros((n, 1 + self.width * 3), dtype=np.uint8)
+        raw[:, 1:] = rows.reshape(n, -1)
+        data = self._z.compress(raw.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows += n
+
+    def close(self):
+        if self._f.closed: return
+        try:
+            if self.rows == self.height:
+                self._chunk(b'IDAT', self._z.flush())
+                self._chunk(b'IEND', b'')
+        finally:
+            self._f.close()
+
+
+class StripCompositor:
+    """Builds the map preview in horizontal bands of region rows instead of one canvas.
+
+    Tiles may arrive in any order; each band is reduced and streamed into the PNG as soon
+    as all of its regions are in, then dropped. Memory is one band plus the tiles of
+    bands that are still incomplete, so feeding regions roughly in row order keeps it
+    bounded whatever the world size. Output matches MapCanvas at the same scale."""
+
+    def __init__(self, out_path, regions, max_res=2048, min_size=512):
+        xs = [rx for rx, _ in regions]
+        zs = [rz for _, rz in regions]
+        self.min_x, self.min_z = min(xs), min(zs)
+        width_chunks = (max(xs) - self.min_x + 1) * REGION_CHUNKS
+        height_chunks = (max(zs) - self.min_z + 1) * REGION_CHUNKS
+        self.width_chunks = width_chunks
+        self.factor = MapCanvas.scale_for(width_chunks, height_chunks, max_res)
+        self.width = -(-width_chunks // self.factor)
+        self.height = -(-height_chunks // self.factor)
+        # A band is the region rows that share output rows: one row, or several when a
+        # whole region is smaller than a pixel
+        self.band_regions = max(1, self.factor // REGION_CHUNKS)
+        self.bands = -(-(max(zs) - self.min_z + 1) // self.band_regions)
+        self.expected = [0] * self.bands
+        for rz in zs:
+            self.expected[self._band(rz)] += 1
+
+        # Small worlds: integer nearest-neighbour upscale so the preview is at least min_size
+        self.upscale = 1
+        if self.width < 2 * min_size:
+            self.upscale = max(1, -(-min_size // max(self.width, self.height)))
+
+        self.out_path = out_path
+        self._tmp_path = out_path + ".tmp"
+        self._writer = PNGStreamWriter(self._tmp_path, self.width * self.upscale, self.height * self.upscale)
+        self._pending = {}
+        self._received = [0] * self.bands
+        self._next = 0
+        self._flush_ready()
+
+    def _band(self, rz):
+        return (rz - self.min_z) // self.band_regions
+
+    def add_tile(self, rx, rz, tile):
+        band = self._band(rz)
+        self._received[band] += 1
+        if tile is not None:
+            self._pending.setdefault(band, []).append((rx, rz, tile))
+        self._flush_ready()
+
+    def _flush_ready(self):
+        while self._next < self.bands and self._received[self._next] >= self.expected[self._next]:
+            self._write_band(self._next)
+            self._next += 1
+
+    def _write_band(self, band):
+        top_rz = self.min_z + band * self.band_regions
+        rows = min(self.band_regions, self.min_z + self.bands * self.band_regions - top_rz)
+        canvas = MapCanvas(self.width_chunks, rows * REGION_CHUNKS, factor=self.factor)
+        for rx, rz, tile in self._pending.pop(band, ()):
+            canvas.add_tile((rx - self.min_x) * REGION_CHUNKS, (rz - top_rz) * REGION_CHUNKS, tile)
+        pixels = canvas.to_array()
+        # The last band of a reduced map can stick out past the bottom edge
+        pixels = pixels[:self.height - self._writer.rows // self.upscale]
+        if self.upscale > 1:
+            pixels = pixels.repeat(self.upscale, axis=0).repeat(self.upscale, axis=1)
+        self._writer.write_rows(pixels)
+
+    def finish(self):
+        """Completes the PNG and moves it into place. Returns False if regions are missing."""
+        complete = self._next == self.bands
+        self._writer.close()
+        if complete:
+            os.replace(self._tmp_path, self.out_path)
+        else:
+            self.abort()
+        return complete
+
+    def abort(self):
+        """Drops the partial image; the previous preview (if any) stays untouched"""
+        self._writer.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+def palette_fingerprint(palette_path):
+    """Hash of block_colors.json (order matters: it breaks priority ties)"""
+    h = hashlib.sha1(f"v{TILE_FORMAT_VERSION}".encode())
+    if os.path.exists(palette_path):
+        with open(palette_path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class RegionTileCache:
+    """Rendered region tiles on disk, keyed by region file name + size + mtime + palette hash.
+
+    Layout: <cache_dir>/index.json plus one raw <rx>.<rz>.tile (RGBA, 32x32) and one
+    <rx>.<rz>.hashes (1024 u64 chunk hashes, see RegionFile.chunk_hashes) per region.
+    Regions that failed to decode are remembered too (tile None) until the file changes.
+    The index also keeps the regions whose pyramid tiles are still outdated ("pyramid_dirty"),
+    so a render cancelled before the pyramid step doesn't leave them stale for good."""
+
+    def __init__(self, cache_dir, palette_hash):
+        self.cache_dir = cache_dir
+        self.palette_hash = palette_hash
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._old = {}
+        self._new = {}
+        self._stored = set()
+        self._pyramid_dirty = set()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    index = json.load(f)
+                if "regions" in index:
+                    self._old = index["regions"]
+                    self._pyramid_dirty = set(index.get("pyramid_dirty", []))
+                else:
+                    # Older caches: a flat {region: entry} map
+                    self._old = index
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable tile cache index: {e}")
+
+    def _fingerprint(self, rf_path):
+        st = os.stat(rf_path)
+        return {"size": st.st_size, "mtime": st.st_mtime_ns, "palette": self.palette_hash}
+
+    def lookup(self, rf_path):
+        """Returns (hit, tile). hit is False when the region has to be rendered."""
+        name = os.path.basename(rf_path)
+        entry = self._old.get(name)
+        try:
+            fp = self._fingerprint(rf_path)
+        except OSError:
+            return False, None
+        if not entry or any(entry.get(k) != v for k, v in fp.items()):
+            return False, None
+        if entry.get("tile") is None:
+            self._new[name] = entry
+            return True, None
+        try:
+            with open(os.path.join(self.cache_dir, entry["tile"]), 'rb') as f:
+                tile = f.read()
+        except OSError:
+            return False, None
+        if len(tile) != TILE_BYTES:
+            return False, None
+        self._new[name] = entry
+        return True, tile
+
+    def previous(self, rf_path):
+        """(tile, hashes) of the last render of a changed region, if it used the same palette,
+        so render_region only decodes the chunks that differ. None otherwise."""
+        entry = self._old.get(os.path.basename(rf_path))
+        if not entry or entry.get("palette") != self.palette_hash: return None
+        if not entry.get("tile") or not entry.get("hashes"): return None
+        try:
+            with open(os.path.join(self.cache_dir, entry["tile"]), 'rb') as f:
+                tile = f.read()
+            with open(os.path.join(self.cache_dir, entry["hashes"]), 'rb') as f:
+                hashes = f.read()
+        except OSError:
+            return None
+        if len(tile) != TILE_BYTES or len(hashes) != 8 * REGION_CHUNKS * REGION_CHUNKS:
+            return None
+        return tile, hashes
+
+    def store(self, rf_path, tile, hashes=None):
+        name = os.path.basename(rf_path)
+        try:
+            entry = self._fingerprint(rf_path)
+        except OSError:
+            return
+        entry["tile"] = None
+        if tile is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tile_name = name.replace(".region.bin", ".tile")
+            with open(os.path.join(self.cache_dir, tile_name), 'wb') as f:
+                f.write(tile)
+            entry["tile"] = tile_name
+            if hashes is not None:
+                hashes_name = name.replace(".region.bin", ".hashes")
+                with open(os.path.join(self.cache_dir, hashes_name), 'wb') as f:
+                    f.write(hashes)
+                entry["hashes"] = hashes_name
+        self._new[name] = entry
+        self._stored.add(name)
+
+    def read_tile(self, name):
+        """Tile bytes of a region (by file name) known to this render, or None"""
+        entry = self._new.get(name)
+        if not entry or not entry.get("tile"): return None
+        try:
+            with open(os.path.join(self.cache_dir, entry["tile"]), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def changed(self):
+        """Region file names rendered in this run or gone since the previous one, plus those
+        an earlier run left out of the pyramid"""
+        return self._stored | (set(self._old) - set(self._new)) | self._pyramid_dirty
+
+    def save(self, complete=True, pyramid_built=True):
+        """Writes the index and drops stale tiles.
+
+        complete=False (cancelled render) keeps the regions this run never reached and
+        deletes nothing. Regions whose pyramid tiles weren't redrawn (pyramid_built=False or
+        an incomplete render) are recorded as pyramid_dirty for the next build."""
+        if complete:
+            regions = self._new
+            dirty = set() if pyramid_built else self.changed()
+        else:
+            regions = dict(self._old)
+            regions.update(self._new)
+            dirty = self._stored | self._pyramid_dirty
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"regions": regions, "pyramid_dirty": sorted(dirty)}, f)
+        os.replace(tmp, self.index_path)
+        if not complete: return
+
+        live = {e[k] for e in regions.values() for k in ("tile", "hashes") if e.get(k)}
+        for f in os.listdir(self.cache_dir):
+            if f.endswith((".tile", ".hashes")) and f not in live:
+                try:
+                    os.remove(os.path.join(self.cache_dir, f))
+                except OSError:
+                    pass
+
+
+def _region_coords(name):
+    parts = name.split('.')
+    return int(parts[0]), int(parts[1])
+
+
+def _pyramid_levels(base_tiles):
+    """Number of halvings until every base tile collapses into one tile"""
+    levels = 0
+    coords = set(base_tiles)
+    while len({x for x, _ in coords}) > 1 or len({y for _, y in coords}) > 1:
+        coords = {(x >> 1, y >> 1) for x, y in coords}
+        levels += 1
+    return levels
+
+
+def build_tile_pyramid(cache, region_names, tiles_dir):
+    """Writes z/x/y.png tiles for the regions in this render and returns the pyramid metadata.
+
+    z = max_zoom is 1 pixel per chunk (REGIONS_PER_TILE x REGIONS_PER_TILE regions per tile);
+    each lower zoom averages 2x2 pixels. Tile coordinates count from the north-west corner
+    of the explored area ("origin", in chunks), so the whole world collapses into tile 0/0/0.
+    Only tiles covering regions that changed since the last build are redrawn, one tile at
+    a time, so memory stays bounded regardless of world size."""
+    coords = [_region_coords(name) for name in region_names]
+    if not coords: return None
+    ox = min(rx for rx, _ in coords) // REGIONS_PER_TILE
+    oy = min(rz for _, rz in coords) // REGIONS_PER_TILE
+
+    def base_tile(rx, rz):
+        return rx // REGIONS_PER_TILE - ox, rz // REGIONS_PER_TILE - oy
+
+    base = {}
+    for (rx, rz), name in zip(coords, region_names):
+        base.setdefault(base_tile(rx, rz), []).append((rx, rz, name))
+    max_zoom = _pyramid_levels(base)
+    origin = [ox * PYRAMID_TILE_SIZE, oy * PYRAMID_TILE_SIZE]
+
+    meta_path = os.path.join(tiles_dir, "tiles.json")
+    old_meta = None
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path, 'r') as f:
+                old_meta = json.load(f)
+        except Exception:
+            old_meta = None
+
+    if (old_meta and old_meta.get("max_zoom") == max_zoom and old_meta.get("origin") == origin
+            and old_meta.get("palette") == cache.palette_hash):
+        dirty = set()
+        for name in cache.changed():
+            rx, rz = _region_coords(name)
+            dirty.add(base_tile(rx, rz))
+    else:
+        # Tile numbering or colors changed: start over
+        if os.path.exists(tiles_dir):
+            for root, dirs, files in os.walk(tiles_dir, topdown=False):
+                for f in files: os.remove(os.path.join(root, f))
+                for d in dirs: os.rmdir(os.path.join(root, d))
+        dirty = set(base)
+
+    def tile_path(z, x, y):
+        return os.path.join(tiles_dir, str(z), str(x), f"{y}.png")
+
+    def write_tile(z, x, y, img):
+        path = tile_path(z, x, y)
+        if img is None or img.getbbox() is None:
+            if os.path.exists(path): os.remove(path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        img.save(path)
+
+    # Deepest zoom: straight from the region tiles
+    for tx, ty in dirty:
+        img = None
+        for rx, rz, name in base.get((tx, ty), []):
+            tile = cache.read_tile(name)
+            if tile is None: continue
+            if img is None:
+                img = Image.new('RGBA', (PYRAMID_TILE_SIZE, PYRAMID_TILE_SIZE), (0, 0, 0, 0))
+            region_img = Image.frombytes('RGBA', (REGION_CHUNKS, REGION_CHUNKS), tile)
+            img.paste(region_img, ((rx - (tx + ox) * REGIONS_PER_TILE) * REGION_CHUNKS, (rz - (ty + oy) * REGIONS_PER_TILE) * REGION_CHUNKS))
+        write_tile(max_zoom, tx, ty, img)
+
+    # Lower zooms: 2x2 children averaged down (premultiplied so holes don't darken edges)
+    for z in range(max_zoom - 1, -1, -1):
+        dirty = {(x >> 1, y >> 1) for x, y in dirty}
+        for px, py in dirty:
+            canvas = None
+            for dx in (0, 1):
+                for dy in (0, 1):
+                    child = tile_path(z + 1, px * 2 + dx, py * 2 + dy)
+                    if not os.path.exists(child): continue
+                    if canvas is None:
+                        canvas = Image.new('RGBa', (PYRAMID_TILE_SIZE * 2, PYRAMID_TILE_SIZE * 2), (0, 0, 0, 0))
+                    with Image.open(child) as child_img:
+                        canvas.paste(child_img.convert('RGBa'), (dx * PYRAMID_TILE_SIZE, dy * PYRAMID_TILE_SIZE))
+            write_tile(z, px, py, canvas.reduce(2).convert('RGBA') if canvas is not None else None)
+
+    xs = [rx for rx, _ in coords]
+    zs = [rz for _, rz in coords]
+    meta = {
+        "tile_size": PYRAMID_TILE_SIZE,
+        "min_zoom": 0,
+        "max_zoom": max_zoom,
+        # Chunk coordinates of tile x=0, y=0 (at every zoom)
+        "origin": origin,
+        # Explored area in chunk coordinates (max exclusive)
+        "bounds": [min(xs) * REGION_CHUNKS, min(zs) * REGION_CHUNKS, (max(xs) + 1) * REGION_CHUNKS, (max(zs) + 1) * REGION_CHUNKS],
+        "palette": cache.palette_hash,
+        "version": int(time.time())
+    }
+    os.makedirs(tiles_dir, exist_ok=True)
+    tmp = meta_path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+    return meta
+
+
+def list_block_textures(zip_path, nested=False):
+    """Block texture members of an asset archive, in archive order.
+    nested=True also accepts BlockTextures folders below the archive root, as mods ship them."""
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        names = [n for n in z.namelist() if n.endswith(".png")]
+    if nested:
+        marker = "/" + BLOCK_TEXTURE_PREFIX
+        return [n for n in names if n.startswith(BLOCK_TEXTURE_PREFIX) or marker in n]
+    return [n for n in names if n.startswith(BLOCK_TEXTURE_PREFIX)]
+
+
+def average_texture_colors(zip_path, names):
+    """Mean color of each texture, weighted by alpha so transparent pixels (leaves, plants)
+    don't drag the average towards black. Returns [(name, [r, g, b]), ...] in input order.
+    Runs in palette worker processes, each opening the archive itself."""
+    colors = []
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        for name in names:
+            try:
+                with z.open(name) as f:
+                    img = Image.open(f)
+                    px = np.asarray(img.convert('RGBA'), dtype=np.float64).reshape(-1, 4)
+                alpha = px[:, 3]
+                weight = alpha.sum()
+                if weight > 0:
+                    rgb = (px[:, :3] * alpha[:, None]).sum(axis=0) / weight
+                else:
+                    rgb = px[:, :3].mean(axis=0)
+                colors.append((name, [int(round(c)) for c in rgb]))
+            except Exception as e:
+                logger.warning(f"Skipping texture {name}: {e}")
+    return colors
+
+
+def mod_texture_colors(zip_path):
+    """Palette entries contributed by one mod archive ({} if it ships no block textures)"""
+    try:
+        names = list_block_textures(zip_path, nested=True)
+    except (OSError, zipfile.BadZipFile) as e:
+        logger.warning(f"Skipping mod archive {zip_path}: {e}")
+        return {}
+    colors = {}
+    for name, rgb in average_texture_colors(zip_path, names):
+        colors[os.path.splitext(os.path.basename(name))[0]] = rgb
+    return colors
+
+
+def init_worker(compiled):
+    """ProcessPoolExecutor initializer: ships the compiled palette once per worker process"""
+    global _worker_classifier
+    _worker_classifier = ChunkClassifier(compiled)
+
+
+def render_region_worker(rx, rz, rf_path, previous=None):
+    """Pool entry point (uses the classifier installed by init_worker)"""
+    tile, hashes = render_region(rx, rz, rf_path, _worker_classifier, previous)
+    return rx, rz, tile, hashes
@@ -0,0 +1,455 @@
+import os
+import copy
+import shutil
+import json
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("MapGen")
+
+SCHEMA_VERSION = 1
+
+# Placeholder internal id of archives without a readable manifest; never a useful lookup key
+UNKNOWN_INTERNAL_ID = "Unknown:Unknown"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS mods (
+    id TEXT PRIMARY KEY,
+    internal_id TEXT,
+    file_name TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mods_internal_id ON mods (internal_id);
+CREATE INDEX IF NOT EXISTS mods_file_name ON mods (file_name);
+CREATE TABLE IF NOT EXISTS packs (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pack_mods (
+    pack TEXT NOT NULL,
+    mod_id TEXT NOT NULL,
+    PRIMARY KEY (pack, mod_id)
+);
+CREATE INDEX IF NOT EXISTS pack_mods_mod ON pack_mods (mod_id);
+"""
+
+
+class SQLiteStore:
+    """Library and modpacks in one SQLite database (WAL mode).
+
+    Mods are rows keyed by their CurseForge id (as text, like library.json keys) with
+    their JSON entry in `data`; packs keep their whole JSON object too, plus a pack_mods
+    table mirroring each pack's mod list so lookups by mod don't scan every pack.
+    The load_*/save_* methods speak the same dicts and lists the JSON files held;
+    saving diffs against what's stored and only writes the rows that changed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema', ?)", (str(SCHEMA_VERSION),))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # --- Library ---
+    def _mod_row(self, mod_id, info):
+        return (str(mod_id), info.get("internal_id"), info.get("file_name"), json.dumps(info))
+
+    def load_library(self):
+        with self.lock:
+            return {mid: json.loads(data) for mid, data in self.conn.execute("SELECT id, data FROM mods")}
+
+    def save_library(self, lib):
+        """Replaces the library with `lib`, writing only added/changed/removed rows"""
+        with self.lock, self.conn:
+            stored = dict(self.conn.execute("SELECT id, data FROM mods"))
+            rows = [self._mod_row(mid, info) for mid, info in lib.items()]
+            changed = [r for r in rows if stored.get(r[0]) != r[3]]
+            self.conn.executemany("INSERT OR REPLACE INTO mods VALUES (?, ?, ?, ?)", changed)
+            gone = [(mid,) for mid in stored.keys() - {str(m) for m in lib}]
+            self.conn.executemany("DELETE FROM mods WHERE id = ?", gone)
+
+    def get_mod(self, mod_id):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM mods WHERE id = ?", (str(mod_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_mod(self, mod_id, info):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO mods VALUES (?, ?, ?, ?)", self._mod_row(mod_id, info))
+
+    def delete_mods(self, mod_ids):
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM mods WHERE id = ?", [(str(m),) for m in mod_ids])
+
+    # --- Modpacks ---
+    def _write_pack(self, pack, position):
+        name = pack["name"]
+        self.conn.execute("INSERT OR REPLACE INTO packs VALUES (?, ?, ?)", (name, position, json.dumps(pack)))
+        old = {m for (m,) in self.conn.execute("SELECT mod_id FROM pack_mods WHERE pack = ?", (name,))}
+        new = {str(m) for m in pack.get("mods", [])}
+        self.conn.executemany("DELETE FROM pack_mods WHERE pack = ? AND mod_id = ?", [(name, m) for m in old - new])
+        self.conn.executemany("INSERT INTO pack_mods VALUES (?, ?)", [(name, m) for m in new - old])
+
+    def load_modpacks(self):
+        with self.lock:
+            return [json.loads(data) for (data,) in self.conn.execute("SELECT data FROM packs ORDER BY position")]
+
+    def save_modpacks(self, packs):
+        """Replaces the pack list with `packs`, writing only packs that changed"""
+        with self.lock, self.conn:
+            stored = {name: (pos, data) for name, pos, data in self.conn.execute("SELECT name, position, data FROM packs")}
+            for pos, pack in enumerate(packs):
+                if stored.get(pack["name"]) != (pos, json.dumps(pack)):
+                    self._write_pack(pack, pos)
+            gone = stored.keys() - {p["name"] for p in packs}
+            self.conn.executemany("DELETE FROM packs WHERE name = ?", [(n,) for n in gone])
+            self.conn.executemany("DELETE FROM pack_mods WHERE pack = ?", [(n,) for n in gone])
+
+    def get_pack(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM packs WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_pack(self, pack):
+        """Inserts or updates one pack (new packs go last)"""
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT position FROM packs WHERE name = ?", (pack["name"],)).fetchone()
+            if row:
+                position = row[0]
+            else:
+                position = self.conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM packs").fetchone()[0]
+            self._write_pack(pack, position)
+
+    def update_pack(self, name, fn):
+        """Runs fn(pack) on a stored pack and saves it, atomically with respect to other
+        writers. fn returns False to skip saving. Returns the pack, or None if missing."""
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT position, data FROM packs WHERE name = ?", (name,)).fetchone()
+            if not row: return None
+            pack = json.loads(row[1])
+            if fn(pack) is not False:
+                self._write_pack(pack, row[0])
+            return pack
+
+    def delete_pack(self, name):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM packs WHERE name = ?", (name,))
+            self.conn.execute("DELETE FROM pack_mods WHERE pack = ?", (name,))
+
+    # --- Reverse lookups (served by the indexes) ---
+    def packs_with_mod(self, mod_id):
+        """Names of the packs listing a mod, in pack order"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT pack_mods.pack FROM pack_mods JOIN packs ON packs.name = pack_mods.pack "
+                "WHERE pack_mods.mod_id = ? ORDER BY packs.position", (str(mod_id),))
+            return [name for (name,) in rows]
+
+    def mods_with_internal_id(self, internal_id):
+        """Ids of the library mods whose archive declares internal_id (Group:Name)"""
+        if not internal_id or internal_id == UNKNOWN_INTERNAL_ID: return []
+        with self.lock:
+            return [mid for (mid,) in self.conn.execute("SELECT id FROM mods WHERE internal_id = ? ORDER BY id", (internal_id,))]
+
+    def mods_with_file(self, file_name):
+        if not file_name: return []
+        with self.lock:
+            return [mid for (mid,) in self.conn.execute("SELECT id FROM mods WHERE file_name = ? ORDER BY id", (file_name,))]
+
+    def flush(self):
+        """Writes are committed as they happen; nothing to do"""
+
+    # --- JSON export ---
+    def export_json(self, target_dir):
+        """Writes library.json and modpacks.json (the pre-database format) to target_dir"""
+        os.makedirs(target_dir, exist_ok=True)
+        paths = []
+        for name, data in (("library.json", self.load_library()), ("modpacks.json", self.load_modpacks())):
+            path = os.path.join(target_dir, name)
+            with open(path + ".tmp", 'w') as f:
+                json.dump(data, f)
+            os.replace(path + ".tmp", path)
+            paths.append(path)
+        return paths
+
+
+class JSONStore:
+    """Library and modpacks as library.json / modpacks.json, held in memory.
+
+    Same interface as SQLiteStore. Reads are served from the in-memory copy, which is
+    reloaded only when a file's mtime changes (someone edited it outside the app).
+    Mutations mark the data dirty and (re)start a `delay` second timer; once mutations
+    stop for that long, or `max_delay` seconds after the first unsaved one, everything
+    dirty is written at once (temp file + os.replace), so a burst of edits costs one
+    write. Callers always get deep copies and the store keeps its own, as with SQLite.
+    Operations spanning slow steps (an install
+    downloading its dependencies) may see the timer fire in between; they call flush()
+    when done so their result is on disk when they return."""
+
+    def __init__(self, library_file, modpacks_file, delay=0.5, max_delay=3.0):
+        self.paths = {"library": library_file, "modpacks": modpacks_file}
+        self.delay = delay
+        self.max_delay = max_delay
+        self.lock = threading.RLock()
+        self.library = None
+        self.packs = None # name -> pack, in list order
+        # Reverse indexes, kept in step with every mutation
+        self.by_internal_id = {} # internal_id -> {mod id}
+        self.by_file = {} # file_name -> {mod id}
+        self.mod_packs = {} # mod id -> {pack name}
+        self.mtimes = {}
+        self.dirty = set()
+        self.dirty_since = None
+        self.timer = None
+        atexit.register(self.flush)
+
+    def close(self):
+        self.flush()
+
+    # --- Loading / write-behind ---
+    def _read(self, kind, default):
+        path = self.paths[kind]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return default, None
+        if self.mtimes.get(kind) == mtime: return None, mtime
+        try:
+            with open(path, 'r') as f:
+                return json.load(f), mtime
+        except ValueError:
+            # Torn or hand-broken file: keep what we had
+            return None, mtime
+
+    def _lib(self):
+        if "library" not in self.dirty:
+            data, mtime = self._read("library", {})
+            if data is not None or self.library is None:
+                self.library = data if data is not None else {}
+                self._reindex_library()
+            self.mtimes["library"] = mtime
+        return self.library
+
+    def _packs(self):
+        if "modpacks" not in self.dirty:
+            data, mtime = self._read("modpacks", [])
+            if data is not None or self.packs is None:
+                self.packs = {p["name"]: p for p in (data or [])}
+                self._reindex_packs()
+            self.mtimes["modpacks"] = mtime
+        return self.packs
+
+    # --- Indexes ---
+    def _index_mod(self, mid, info, add=True):
+        internal_id = info.get("internal_id")
+        if internal_id == UNKNOWN_INTERNAL_ID: internal_id = None
+        for index, key in ((self.by_internal_id, internal_id), (self.by_file, info.get("file_name"))):
+            if not key: continue
+            ids = index.setdefault(key, set())
+            if add:
+                ids.add(mid)
+            else:
+                ids.discard(mid)
+                if not ids: del index[key]
+
+    def _index_pack(self, pack, add=True):
+        for m in pack.get("mods", []):
+            names = self.mod_packs.setdefault(str(m), set())
+            if add:
+                names.add(pack["name"])
+            else:
+                names.discard(pack["name"])
+                if not names: del self.mod_packs[str(m)]
+
+    def _reindex_library(self):
+        self.by_internal_id = {}
+        self.by_file = {}
+        for mid, info in self.library.items():
+            self._index_mod(mid, info)
+
+    def _reindex_packs(self):
+        self.mod_packs = {}
+        for pack in self.packs.values():
+            self._index_pack(pack)
+
+    def _touch(self, kind):
+        """Marks kind dirty and pushes the flush back (debounce), up to max_delay overall"""
+        now = time.monotonic()
+        if not self.dirty: self.dirty_since = now
+        self.dirty.add(kind)
+        if self.timer is not None: self.timer.cancel()
+        wait = min(self.delay, max(0.0, self.dirty_since + self.max_delay - now))
+        self.timer = threading.Timer(wait, self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _write(self, kind, data):
+        path = self.paths[kind]
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        self.mtimes[kind] = os.stat(path).st_mtime_ns
+
+    def flush(self):
+        """Writes whatever is dirty now"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if "library" in self.dirty:
+                self._write("library", self.library)
+            if "modpacks" in self.dirty:
+                self._write("modpacks", list(self.packs.values()))
+            self.dirty.clear()
+
+    # --- Library ---
+    def load_library(self):
+        with self.lock:
+            return copy.deepcopy(self._lib())
+
+    def save_library(self, lib):
+        with self.lock:
+            self._lib()
+            self.library = {str(mid): copy.deepcopy(info) for mid, info in lib.items()}
+            self._reindex_library()
+            self._touch("library")
+
+    def get_mod(self, mod_id):
+        with self.lock:
+            info = self._lib().get(str(mod_id))
+            return copy.deepcopy(info) if info is not None else None
+
+    def put_mod(self, mod_id, info):
+        with self.lock:
+            lib = self._lib()
+            old = lib.get(str(mod_id))
+            if old is not None: self._index_mod(str(mod_id), old, add=False)
+            lib[str(mod_id)] = copy.deepcopy(info)
+            self._index_mod(str(mod_id), info)
+            self._touch("library")
+
+    def delete_mods(self, mod_ids):
+        with self.lock:
+            lib = self._lib()
+            for m in mod_ids:
+                old = lib.pop(str(m), None)
+                if old is not None: self._index_mod(str(m), old, add=False)
+            self._touch("library")
+
+    # --- Modpacks ---
+    def load_modpacks(self):
+        with self.lock:
+            return copy.deepcopy(list(self._packs().values()))
+
+    def save_modpacks(self, packs):
+        with self.lock:
+            self._packs()
+            self.packs = {p["name"]: copy.deepcopy(p) for p in packs}
+            self._reindex_packs()
+            self._touch("modpacks")
+
+    def get_pack(self, name):
+        with self.lock:
+            pack = self._packs().get(name)
+            return copy.deepcopy(pack) if pack is not None else None
+
+    def put_pack(self, pack):
+        with self.lock:
+            packs = self._packs()
+            old = packs.get(pack["name"])
+            if old is not None: self._index_pack(old, add=False)
+            packs[pack["name"]] = copy.deepcopy(pack)
+            self._index_pack(pack)
+            self._touch("modpacks")
+
+    def update_pack(self, name, fn):
+        with self.lock:
+            pack = copy.deepcopy(self._packs().get(name))
+            if pack is None: return None
+            if fn(pack) is not False:
+                self._index_pack(self.packs[name], add=False)
+                self.packs[name] = copy.deepcopy(pack)
+                self._index_pack(pack)
+                self._touch("modpacks")
+            return pack
+
+    def delete_pack(self, name):
+        with self.lock:
+            old = self._packs().pop(name, None)
+            if old is not None:
+                self._index_pack(old, add=False)
+                self._touch("modpacks")
+
+    # --- Reverse lookups ---
+    def packs_with_mod(self, mod_id):
+        with self.lock:
+            packs = self._packs()
+            names = self.mod_packs.get(str(mod_id), ())
+            return [n for n in packs if n in names]
+
+    def mods_with_internal_id(self, internal_id):
+        with self.lock:
+            self._lib()
+            return sorted(self.by_internal_id.get(internal_id, ()))
+
+    def mods_with_file(self, file_name):
+        with self.lock:
+            self._lib()
+            return sorted(self.by_file.get(file_name, ()))
+
+    def export_json(self, target_dir):
+        self.flush()
+        os.makedirs(target_dir, exist_ok=True)
+        paths = []
+        for kind, name in (("library", "library.json"), ("modpacks", "modpacks.json")):
+            path = os.path.join(target_dir, name)
+            shutil.copyfile(self.paths[kind], path)
+            paths.append(path)
+        return paths
+
+
+def open_store(backend, data_dir, flush_delay=0.5):
+    """Opens the configured store ("sqlite" or "json") under data_dir. If the other
+    backend was in use last time, its contents are carried over first."""
+    db_path = os.path.join(data_dir, "nexcore.db")
+    library_file = os.path.join(data_dir, "library.json")
+    modpacks_file = os.path.join(data_dir, "modpacks.json")
+    marker = os.path.join(data_dir, "storage_backend")
+
+    def make(kind):
+        if kind == "json": return JSONStore(library_file, modpacks_file, flush_delay)
+        return SQLiteStore(db_path)
+
+    try:
+        with open(marker, 'r') as f:
+            previous = f.read().strip()
+    except OSError:
+        # Before the marker existed: the database if there is one, else the JSON files
+        previous = "sqlite" if os.path.exists(db_path) else "json"
+
+    store = make(backend)
+    if previous != backend:
+        old = make(previous)
+        library, packs = old.load_library(), old.load_modpacks()
+        old.close()
+        if library or packs:
+            store.save_library(library)
+            store.save_modpacks(packs)
+            store.flush()
+            logger.info(f"Metadata copied from {previous} to {backend}: {len(library)} mods, {len(packs)} packs")
+    with open(marker, 'w') as f:
+        f.write(backend)
+    return store
@@ -4,38 +4,46 @@ import time
 import requests
 import shutil
 import zipfile
+import hashlib
 import sys
 import subprocess
 import threading
 import psutil
 from urllib.request import urlretrieve
-import io
-import struct
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import map_renderer
+import snapshot_store
+import metadata_store
 
-# Configure logging
-logging.basicConfig(
-    filename='map_gen.log',
-    filemode='w',
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    level=logging.DEBUG
-)
 logger = logging.getLogger("MapGen")
 
 try:
-    from PIL import Image, ImageDraw
-    HAS_PIL = True
+    import fcntl
+    # Linux ioctl that makes dst share src's extents (btrfs, xfs, bcachefs)
+    FICLONE = 0x40049409
+    HAS_FICLONE = sys.platform.startswith('linux')
 except ImportError:
-    HAS_PIL = False
+    HAS_FICLONE = False
 
-try:
-    import zstandard as zstd
-    HAS_ZSTD = True
-except ImportError:
-    HAS_ZSTD = False
+# Methods _link_file tries per mod_link_mode, in order
+LINK_MODES = {
+    "auto": ["reflink", "copy"],
+    "hardlink": ["reflink", "hardlink", "copy"],
+    "copy": ["copy"]
+}
 
 class ModManager:
     def __init__(self):
+        # Configured here rather than on import, so processes that merely import this module
+        # (map workers re-importing the main script under spawn) don't truncate the log.
+        # basicConfig is a no-op once the root logger has handlers.
+        logging.basicConfig(
+            filename='map_gen.log',
+            filemode='w',
+            format='%(asctime)s - %(levelname)s - %(message)s',
+            level=logging.DEBUG
+        )
         self.data_dir = os.path.join(os.getcwd(), "data")
         # Where we keep the "master" copy of all mods
         self.library_dir = os.path.join(self.data_dir, "library")
@@ -45,8 +53,17 @@ class ModManager:
         self.config_file = os.path.join(self.data_dir, "config.json")
         
         self.temp_backups_dir = os.path.join(self.data_dir, "temp_backups")
-        
-        for d in [self.data_dir, self.library_dir, self.packs_dir, self.temp_backups_dir]:
+        # The pack's deployed Mods tree is parked here between sessions, described by a manifest
+        self.deployed_dir = os.path.join(self.data_dir, "deployed")
+        self.deploy_manifest_file = os.path.join(self.deployed_dir, "manifest.json")
+        # Library zips extracted once, by archive content hash, and linked into the game
+        self.extracted_dir = os.path.join(self.library_dir, ".extracted")
+        self.extract_lock = threading.Lock()
+        self._link_methods = {}
+        # Deduplicated snapshots of each pack's saves, taken after every session
+        self.snapshots = snapshot_store.SnapshotStore(os.path.join(self.data_dir, "snapshots"))
+        
+        for d in [self.data_dir, self.library_dir, self.packs_dir, self.temp_backups_dir, self.deployed_dir]:
             if not os.path.exists(d):
                 os.makedirs(d)
         
@@ -61,17 +78,19 @@ class ModManager:
         self.sync_lock = threading.Lock()
         self.is_launching = False
 
+        # Background map renders: job_id -> cancel Event
+        self.map_jobs = {}
+        self.map_jobs_lock = threading.Lock()
+        # (pack, save) pairs with a render in progress: they share the preview and tile cache files
+        self.rendering_saves = set()
+        self.palette_lock = threading.RLock()
+
         self.base_url = "https://api.curseforge.com/v1"
         self.game_id = 70216
 
-        if not os.path.exists(self.modpacks_file):
-            with open(self.modpacks_file, 'w') as f:
-                json.dump([], f)
-
+        # Library and modpacks: SQLite (nexcore.db) or cached JSON files, per config
         self.library_file = os.path.join(self.data_dir, "library.json")
-        if not os.path.exists(self.library_file):
-            with open(self.library_file, 'w') as f:
-                json.dump({}, f)
+        self.store = metadata_store.open_store(self.config.get("storage_backend", "sqlite"), self.data_dir)
         
         # Migration: Ensure all mods have internal IDs for save configs
         self.migrate_library_ids()
@@ -81,7 +100,17 @@ class ModManager:
             "api_key": "",
             "game_dir": "",
             "manage_saves": False,
-            "active_modpack": None
+            "active_modpack": None,
+            # auto = reflink from the extracted cache, else copy; hardlink = also hardlink (faster,
+            # but an in-place write to a deployed file alters the shared cache); copy = always copy
+            "mod_link_mode": "auto",
+            "deploy_workers": 0, # threads extracting/linking mods at launch, 0 = auto
+            "storage_backend": "sqlite", # or "json" (library.json/modpacks.json); applied on restart
+            "save_sync_hash": False, # compare contents of same-size saves whose mtime changed
+            "save_snapshots": True, # snapshot the pack's saves after each session
+            "snapshot_keep": 10, # snapshots kept per pack
+            "map_workers": 0, # 0 = one process per CPU core
+            "map_batch_jobs": 2 # saves rendered at once by render_all_maps
         }
         if os.path.exists(self.config_file):
             with open(self.config_file, 'r') as f:
@@ -92,8 +121,10 @@ class ModManager:
 
     def save_config(self, new_config):
         self.config.update(new_config)
-        with open(self.config_file, 'w') as f:
+        tmp = self.config_file + ".tmp"
+        with open(tmp, 'w') as f:
             json.dump(self.config, f)
+        os.replace(tmp, self.config_file)
         return {"status": "success"}
 
     def _extract_internal_id(self, file_path):
@@ -363,19 +394,33 @@ class ModManager:
                     # Robust folder creation
                     if not os.path.exists(pack_dir): os.makedirs(pack_dir)
                     
-                    if os.path.exists(pack_saves_dir): 
-                        shutil.rmtree(pack_saves_dir)
-                    
-                    shutil.copytree(game_saves_dir, pack_saves_dir)
-                    print(f"Saves synced back to pack: {pack_name}")
+                    # The state before the first session is worth keeping too
+                    if self.config.get("save_snapshots") and os.path.isdir(pack_saves_dir) and not self.snapshots.list(pack_name):
+                        self.snapshots.create(pack_name, pack_saves_dir, "Antes da primeira sessão")
+
+                    # Only what the session changed is copied back
+                    stats = self._delta_sync_tree(game_saves_dir, pack_saves_dir, self.config.get("save_sync_hash", False))
+                    print(f"Saves synced back to pack: {pack_name} ({stats['copied']} copiados, "
+                          f"{stats['bytes'] / 1e6:.1f} MB, {stats['kept']} mantidos, {stats['deleted']} removidos)")
                 except Exception as e:
                     print(f"Error syncing saves back: {e}")
+                else:
+                    # A session that changed nothing would only push older snapshots out
+                    if self.config.get("save_snapshots") and (stats['copied'] or stats['deleted']):
+                        if callback: callback("Criando snapshot dos mundos...")
+                        try:
+                            snap = self.snapshots.create(pack_name, pack_saves_dir, "Sessão")
+                            self.snapshots.prune(pack_name, self.config.get("snapshot_keep", 10))
+                            print(f"Snapshot {snap['id']}: {snap['stored'] / 1e6:.1f} MB novos de {snap['size'] / 1e6:.1f} MB")
+                        except Exception as e:
+                            print(f"Erro ao criar snapshot: {e}")
 
-            # 2. Delete Mods from Game Folder (Non-destructive)
+            # 2. Move the pack's Mods out of the Game Folder (Non-destructive); they're parked
+            # so the next launch only has to apply what changed
             if callback: callback("Limpando arquivos temporários...")
             try:
                 if os.path.exists(game_mods_dir):
-                    self._clear_directory(game_mods_dir)
+                    self._park_deployed_mods(game_mods_dir)
                     print("Game Mods folder cleared.")
             except Exception as e:
                 print(f"Error clearing mods: {e}")
@@ -390,61 +435,180 @@ class ModManager:
                     print(f"Error clearing saves: {e}")
 
             # 4. Restore Original Game State (Pre-NEXCore Files)
-            self._restore_original_game_state(game_mods_dir, game_saves_dir, callback=callback)
+            self._unstash_game_state(game_mods_dir, game_saves_dir, callback=callback)
 
-    def _backup_current_game_state(self, mods_dir, saves_dir, callback=None):
-        """Backs up existing mods/saves from game folder to temp storage"""
-        if callback: callback("Criando backup de segurança dos seus arquivos...")
-        print("Iniciando backup temporário dos arquivos do jogo...")
-        self._clear_directory(self.temp_backups_dir)
-        
+    def _load_stash(self):
+        """{name: folder} of the user's folders currently moved into temp_backups"""
         try:
-            # Backup Mods
-            if os.path.exists(mods_dir) and os.listdir(mods_dir):
-                dst = os.path.join(self.temp_backups_dir, "Mods")
-                shutil.copytree(mods_dir, dst)
-                print("Mods originais salvos em backup temporário.")
-                
-            # Backup Saves
-            if os.path.exists(saves_dir) and os.listdir(saves_dir):
-                dst = os.path.join(self.temp_backups_dir, "Saves")
-                shutil.copytree(saves_dir, dst)
-                print("Saves originais salvos em backup temporário.")
-        except Exception as e:
-            print(f"Erro ao criar backup temporário: {e}")
+            with open(os.path.join(self.temp_backups_dir, "stash.json"), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
 
-    def _restore_original_game_state(self, mods_dir, saves_dir, callback=None):
-        """Restores files from temp storage back to game folder"""
-        if callback: callback("Restaurando seus arquivos originais...")
-        print("Restaurando arquivos originais do usuário...")
-        
+    def _save_stash(self, stash):
+        path = os.path.join(self.temp_backups_dir, "stash.json")
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(stash, f)
+        os.replace(tmp, path)
+
+    def _stash_dir(self, path, name):
+        """Moves a folder's contents to temp_backups/<name>, leaving it empty. A rename
+        when both are on the same disk, copy + delete otherwise. Returns False if there
+        was nothing to move."""
+        if not os.path.isdir(path) or not os.listdir(path): return False
+        stash = os.path.join(self.temp_backups_dir, name)
         try:
-            # Restore Mods
-            src_mods = os.path.join(self.temp_backups_dir, "Mods")
-            if os.path.exists(src_mods):
-                if not os.path.exists(mods_dir): os.makedirs(mods_dir)
-                for item in os.listdir(src_mods):
-                    s = os.path.join(src_mods, item)
-                    d = os.path.join(mods_dir, item)
-                    if os.path.isdir(s): shutil.copytree(s, d)
-                    else: shutil.copy2(s, d)
-                print("Mods originais restaurados.")
-
-            # Restore Saves
-            src_saves = os.path.join(self.temp_backups_dir, "Saves")
-            if os.path.exists(src_saves):
-                if not os.path.exists(saves_dir): os.makedirs(saves_dir)
-                for item in os.listdir(src_saves):
-                    s = os.path.join(src_saves, item)
-                    d = os.path.join(saves_dir, item)
-                    if os.path.isdir(s): shutil.copytree(s, d)
-                    else: shutil.copy2(s, d)
-                print("Saves originais restaurados.")
-                
-            # Clear temp after restore
-            self._clear_directory(self.temp_backups_dir)
-        except Exception as e:
-            print(f"Erro ao restaurar arquivos originais: {e}")
+            os.rename(path, stash)
+        except OSError:
+            # Another disk (EXDEV) or a folder Windows won't let go of
+            tmp = stash + ".tmp"
+            if os.path.exists(tmp): shutil.rmtree(tmp)
+            shutil.copytree(path, tmp, symlinks=True)
+            os.rename(tmp, stash)
+            self._clear_directory(path)
+        os.makedirs(path, exist_ok=True)
+        return True
+
+    def _unstash_dir(self, path, name):
+        """Puts a stashed folder back, by rename if the game's copy is empty"""
+        stash = os.path.join(self.temp_backups_dir, name)
+        if not os.path.exists(stash): return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.isdir(path) and not os.listdir(path): os.rmdir(path)
+        if not os.path.exists(path):
+            try:
+                os.rename(stash, path)
+                return
+            except OSError:
+                os.makedirs(path, exist_ok=True)
+        # Folder not empty or on another disk: move item by item, the user's files win
+        for item in os.listdir(stash):
+            d = os.path.join(path, item)
+            if os.path.lexists(d): self._remove_path(d)
+            shutil.move(os.path.join(stash, item), d)
+        shutil.rmtree(stash)
+
+    def _stash_game_state(self, mods_dir, saves_dir, callback=None):
+        """Moves the user's own Mods (and Saves, when the pack manages them) out of the game folder"""
+        if callback: callback("Guardando seus arquivos...")
+        stash = self._load_stash()
+
+        # Anything not recorded in the stash is a stale copy from an older backup
+        for item in os.listdir(self.temp_backups_dir):
+            if item != "stash.json" and item not in stash:
+                self._remove_path(os.path.join(self.temp_backups_dir, item))
+
+        targets = {"Mods": mods_dir}
+        if self.config.get("manage_saves"): targets["Saves"] = saves_dir
+        for name, path in targets.items():
+            if name in stash:
+                # A session that was never cleaned up: the stash still holds the user's
+                # originals, what's in the game folder now is ours
+                print(f"{name} originais de uma sessão anterior ainda guardados, mantendo-os.")
+                continue
+            try:
+                if self._stash_dir(path, name):
+                    stash[name] = path
+                    self._save_stash(stash)
+                    print(f"{name} originais guardados.")
+            except Exception as e:
+                print(f"Erro ao guardar {name} originais: {e}")
+
+    def _unstash_game_state(self, mods_dir, saves_dir, callback=None):
+        """Moves the folders taken by _stash_game_state back into the game folder"""
+        if callback: callback("Restaurando seus arquivos originais...")
+        stash = self._load_stash()
+        paths = {"Mods": mods_dir, "Saves": saves_dir}
+        for name in list(stash):
+            try:
+                self._unstash_dir(paths.get(name, stash[name]), name)
+                del stash[name]
+                self._save_stash(stash)
+                print(f"{name} originais restaurados.")
+            except Exception as e:
+                print(f"Erro ao restaurar {name} originais: {e}")
+
+    def _copy_file_fast(self, src, dst):
+        """Copies src over dst in the kernel (copy_file_range, else sendfile) through a
+        temp file, so an interrupted sync never leaves a truncated region file behind"""
+        tmp = dst + ".nexsync"
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            offset = 0
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    while offset < size:
+                        n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset, offset, offset)
+                        if n == 0: break
+                        offset += n
+                except OSError:
+                    pass # EXDEV/EINVAL on some kernels and filesystems
+            if offset < size and hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+                try:
+                    fdst.seek(offset)
+                    while offset < size:
+                        n = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                        if n == 0: break
+                        offset += n
+                except OSError:
+                    pass
+            # Whatever the kernel didn't copy (or a file that grew meanwhile) goes through userspace
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+            fdst.truncate()
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+
+    def _delta_sync_tree(self, src_dir, dst_dir, verify_hash=False):
+        """Makes dst_dir mirror src_dir, copying only files whose size or mtime differ and
+        deleting what src_dir no longer has. With verify_hash, same-size files with a new
+        mtime are compared by content first and only copied if they really changed.
+        Returns {"copied", "kept", "deleted", "bytes"}."""
+        stats = {"copied": 0, "kept": 0, "deleted": 0, "bytes": 0}
+        os.makedirs(dst_dir, exist_ok=True)
+        for root, dirs, names in os.walk(src_dir):
+            rel_root = os.path.relpath(root, src_dir)
+            target = dst_dir if rel_root == '.' else os.path.join(dst_dir, rel_root)
+
+            for name in dirs:
+                d = os.path.join(target, name)
+                if os.path.lexists(d) and (os.path.islink(d) or not os.path.isdir(d)):
+                    os.remove(d) # a file where the save now has a folder
+                os.makedirs(d, exist_ok=True)
+
+            for name in names:
+                s = os.path.join(root, name)
+                d = os.path.join(target, name)
+                st = os.stat(s)
+                try:
+                    dt = os.lstat(d)
+                except FileNotFoundError:
+                    dt = None
+                if dt is not None and os.path.isdir(d) and not os.path.islink(d):
+                    shutil.rmtree(d)
+                    dt = None
+
+                if dt is not None and dt.st_size == st.st_size:
+                    if dt.st_mtime_ns == st.st_mtime_ns:
+                        stats["kept"] += 1
+                        continue
+                    if verify_hash and self._file_sha256(s) == self._file_sha256(d):
+                        os.utime(d, ns=(st.st_atime_ns, st.st_mtime_ns))
+                        stats["kept"] += 1
+                        continue
+
+                self._copy_file_fast(s, d)
+                stats["copied"] += 1
+                stats["bytes"] += st.st_size
+
+            present = set(dirs) | set(names)
+            for name in os.listdir(target):
+                if name not in present:
+                    self._remove_path(os.path.join(target, name))
+                    stats["deleted"] += 1
+        return stats
 
     # --- API & Search ---
     def search_mods(self, query="", sort_field=1, sort_order="desc", offset=0):
@@ -518,8 +682,7 @@ class ModManager:
         if progress_callback: progress_callback(f"Iniciando exportação de {pack_name}...")
         
         # 1. Find the pack
-        packs = self.load_modpacks()
-        pack = next((p for p in packs if p['name'] == pack_name), None)
+        pack = self.store.get_pack(pack_name)
         if not pack:
             return {"status": "error", "message": f"Modpack '{pack_name}' não encontrado."}
 
@@ -605,8 +768,7 @@ class ModManager:
                 pack_name = manifest.get("name", "Imported Modpack")
                 
                 # Check for collisions
-                packs = self.load_modpacks()
-                if any(p['name'] == pack_name for p in packs):
+                if self.store.get_pack(pack_name):
                     pack_name = f"{pack_name}_{int(time.time())}"
                 
                 # 2. Download/Ensure mods
@@ -620,8 +782,7 @@ class ModManager:
                     if progress_callback:
                         progress_callback(f"Verificando mod {i+1}/{total_mods} (ID: {mod_id})...")
                     
-                    library = self.load_library()
-                    if str(mod_id) not in library:
+                    if self.store.get_mod(mod_id) is None:
                         try:
                             resp = requests.get(f"{self.base_url}/mods/{mod_id}", headers=self.get_headers())
                             if resp.status_code == 200:
@@ -647,9 +808,7 @@ class ModManager:
                     "mods": installed_mods,
                     "created": time.strftime("%Y-%m-%d")
                 }
-                packs.append(new_pack)
-                with open(self.modpacks_file, 'w') as f:
-                    json.dump(packs, f)
+                self.store.put_pack(new_pack)
                 
                 # 4. Extract Overrides
                 if progress_callback: progress_callback("Extraindo mundos e configurações (overrides)...")
@@ -885,25 +1044,109 @@ class ModManager:
             return f"Erro na tradução gratuita: {str(e)}"
 
     # --- Core Logic ---
-        self.library_file = os.path.join(self.data_dir, "library.json")
-        if not os.path.exists(self.library_file):
-            with open(self.library_file, 'w') as f:
-                json.dump({}, f)
 
     def load_library(self):
-        try:
-            with open(self.library_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
+        return self.store.load_library()
 
     def save_library(self, lib_data):
-        with open(self.library_file, 'w') as f:
-            json.dump(lib_data, f)
+        self.store.save_library(lib_data)
 
     def get_mod_info(self, mod_id):
+        return self.store.get_mod(mod_id)
+
+    def export_metadata(self, target_dir=None):
+        """Writes library.json and modpacks.json out of the database, for backups or
+        moving to another install"""
+        target_dir = target_dir or os.path.join(self.data_dir, "export")
+        try:
+            paths = self.store.export_json(target_dir)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        return {"status": "success", "files": paths}
+
+    def _library_file(self, mod_id, lib):
+        """file_name of a library mod whose archive is on disk, or None"""
+        f_name = (lib.get(str(mod_id)) or {}).get('file_name')
+        if f_name and os.path.exists(os.path.join(self.library_dir, f_name)):
+            return f_name
+        return None
+
+    def check_mod_updates(self, mod_ids=None, progress_callback=None):
+        """Compares library files with the latest CurseForge files, batching the lookups
+        through POST /mods instead of one request per mod. Downloads nothing."""
+        if not self.config.get("api_key"): return {"status": "error", "message": "Configure a chave da API para verificar atualizações."}
+
         lib = self.load_library()
-        return lib.get(str(mod_id)) or lib.get(int(mod_id))
+        ids = [str(m) for m in (mod_ids if mod_ids is not None else lib.keys())]
+        ids = [m for m in ids if m.isdigit()]
+        headers = self.get_headers()
+        headers['Content-Type'] = 'application/json'
+        batch_size = 50
+        updates = []
+
+        try:
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                if progress_callback: progress_callback(f"Verificando mods {start + len(batch)}/{len(ids)}...")
+                resp = requests.post(
+                    f"{self.base_url}/mods",
+                    headers=headers,
+                    data=json.dumps({"modIds": [int(m) for m in batch]}),
+                    timeout=30
+                )
+                if resp.status_code != 200:
+                    return {"status": "error", "message": f"Erro da API: {resp.status_code}"}
+
+                for mod in resp.json().get('data', []):
+                    # Same pick as install_mod_to_library: the most recent file
+                    files = sorted(mod.get('latestFiles', []), key=lambda x: x.get('fileDate', ''), reverse=True)
+                    if not files: continue
+                    latest = files[0].get('fileName') or files[0].get('displayName')
+                    mid = str(mod.get('id'))
+                    current = (lib.get(mid) or {}).get('file_name')
+                    if latest and (latest != current or not self._library_file(mid, lib)):
+                        updates.append({
+                            "mod_id": mid,
+                            "name": mod.get('name') or (lib.get(mid) or {}).get('name', mid),
+                            "current": current,
+                            "latest": latest
+                        })
+        except Exception as e:
+            print(f"Update check error: {e}")
+            return {"status": "error", "message": f"Falha ao verificar atualizações: {e}"}
+
+        return {"status": "success", "checked": len(ids), "updates": updates}
+
+    def update_mods(self, mod_ids, progress_callback=None):
+        """Downloads the latest file of each mod and drops the archive it replaces"""
+        updated = []
+        manual = []
+        errors = []
+        processed_ids = set()
+        for i, mod_id in enumerate(mod_ids):
+            mid = str(mod_id)
+            if progress_callback: progress_callback(f"Atualizando mod {i+1}/{len(mod_ids)}...")
+            old_name = (self.store.get_mod(mid) or {}).get('file_name')
+
+            res = self.install_mod_to_library(mid, processed_ids=processed_ids, link_to_pack=False)
+            if res['status'] == 'manual_required':
+                manual.append(res)
+                continue
+            if res['status'] != 'success':
+                errors.append(f"Mod {mid}: {res.get('message')}")
+                continue
+            updated.append(mid)
+
+            new_name = res.get('file_name')
+            if old_name and new_name and old_name != new_name and not self.store.mods_with_file(old_name):
+                try:
+                    os.remove(os.path.join(self.library_dir, old_name))
+                except OSError:
+                    pass
+
+        self.store.flush()
+        if updated: self._prune_extracted_mods()
+        return {"status": "success", "updated": updated, "manual": manual, "errors": errors}
 
     # --- Core Logic ---
     def fetch_mod_metadata(self, mod_id):
@@ -913,8 +1156,7 @@ class ModManager:
             if resp.status_code == 200:
                 data = resp.json().get('data', {})
                 # Update library if it exists there
-                lib = self.load_library()
-                mid_str = str(mod_id)
+                entry = self.store.get_mod(mod_id)
                 
                 # We either update or just return the info
                 info = {
@@ -923,21 +1165,26 @@ class ModManager:
                     "logo": data.get("logo", {}),
                     "summary": data.get("summary", ""),
                     "links": data.get("links", {}),
-                    "file_name": lib.get(mid_str, {}).get("file_name", f"{mod_id}.zip")
+                    "file_name": (entry or {}).get("file_name", f"{mod_id}.zip")
                 }
                 
-                if mid_str in lib:
-                    lib[mid_str].update(info)
-                    self.save_library(lib)
+                if entry is not None:
+                    entry.update(info)
+                    self.store.put_mod(mod_id, entry)
                 
                 return info
             return None
         except:
             return None
 
-    def install_mod_to_library(self, mod_id, mod_metadata=None, processed_ids=None):
+    def install_mod_to_library(self, mod_id, mod_metadata=None, processed_ids=None, link_to_pack=True):
         """Downloads mod to library and recursively installs required dependencies"""
-        if processed_ids is None: processed_ids = set()
+        if processed_ids is None:
+            # Top-level call: the metadata is on disk by the time it returns
+            try:
+                return self.install_mod_to_library(mod_id, mod_metadata, set(), link_to_pack)
+            finally:
+                self.store.flush()
         
         mod_id_str = str(mod_id)
         if mod_id_str in processed_ids: return {"status": "success", "message": "Já processado"}
@@ -969,7 +1216,7 @@ class ModManager:
                     dep_id = dep.get('modId')
                     # Recursively install dependency
                     # We don't have metadata for it yet, so let it fetch on the fly if needed
-                    self.install_mod_to_library(dep_id, processed_ids=processed_ids)
+                    self.install_mod_to_library(dep_id, processed_ids=processed_ids, link_to_pack=link_to_pack)
                     dep_count += 1
 
             # 3. Download the main mod file
@@ -1010,22 +1257,20 @@ class ModManager:
                 mod_metadata = self.fetch_mod_metadata(mod_id)
             
             if mod_metadata:
-                lib = self.load_library()
                 internal_id = self._extract_internal_id(dest_path)
-                lib[mod_id_str] = {
+                self.store.put_mod(mod_id_str, {
                     "name": mod_metadata.get("name", "Unknown"),
                     "internal_id": internal_id or "Unknown:Unknown",
                     "logo": mod_metadata.get("logo", {}),
                     "summary": mod_metadata.get("summary", ""),
                     "file_name": file_name
-                }
-                self.save_library(lib)
+                })
             
             # 5. Automatic Linking to Active Modpack
             active_pack = self.config.get("active_modpack")
             linked_msg = ""
             
-            if active_pack:
+            if active_pack and link_to_pack:
                 self.add_mod_to_pack(active_pack, mod_id)
                 linked_msg = f" & vinculado a '{active_pack}'"
 
@@ -1040,63 +1285,67 @@ class ModManager:
 
     def delete_mod_from_library(self, mod_id):
         # 1. Load data
-        lib = self.load_library()
         mod_id_str = str(mod_id)
-        info = lib.get(mod_id_str)
+        info = self.store.get_mod(mod_id_str)
         
         if not info:
             return {"status": "error", "message": "Mod não encontrado na biblioteca."}
 
-        # 2. Remove physical file
+        # 2. Remove physical file (unless another library entry points at it)
         file_name = info.get("file_name")
-        if file_name:
+        owns_file = bool(file_name) and self.store.mods_with_file(file_name) == [mod_id_str]
+        if owns_file:
             file_path = os.path.join(self.library_dir, file_name)
             if os.path.exists(file_path):
                 os.remove(file_path)
 
-        # 3. Remove from library.json
-        del lib[mod_id_str]
-        self.save_library(lib)
+        # 3. Remove from the library
+        self.store.delete_mods([mod_id_str])
 
-        # 4. Remove from all modpacks (Robust string-based comparison)
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-        
-        for pack in packs:
-            pack['mods'] = [m for m in pack.get('mods', []) if str(m) != mod_id_str]
-        
-        with open(self.modpacks_file, 'w') as f:
-            json.dump(packs, f)
+        # 4. Remove from the modpacks that list it
+        self._remove_from_packs([mod_id_str])
 
-        # 5. If active in game folder, remove it
-        game_dir = self.config.get("game_dir")
-        if game_dir and file_name:
-            # Default Hytale mods path
-            game_mods_dir = os.path.join(game_dir, "UserData", "Mods")
-            path_in_game = os.path.join(game_mods_dir, file_name)
-            if os.path.exists(path_in_game):
-                os.remove(path_in_game)
-            # Also check if it was extracted (zip)
-            extracted_dir = os.path.join(game_mods_dir, os.path.splitext(file_name)[0])
-            if os.path.exists(extracted_dir):
-                shutil.rmtree(extracted_dir)
+        # 5. If deployed (game folder or parked), remove it (same condition: a shared file stays)
+        if owns_file:
+            self._update_deployed_mods(remove=[file_name])
+            self._prune_extracted_mods()
 
         return {"status": "success"}
 
+    def _remove_from_packs(self, mod_ids):
+        """Drops mods from every pack listing them, found through the mod -> packs index"""
+        ids = {str(m) for m in mod_ids}
+        affected = {name for m in ids for name in self.store.packs_with_mod(m)}
+        for name in affected:
+            self.store.update_pack(name, lambda p: p.update(mods=[m for m in p['mods'] if str(m) not in ids]))
+        return affected
+
+    def get_mod_usage(self, mod_id):
+        """Packs that list a mod"""
+        return {"mod_id": str(mod_id), "packs": self.store.packs_with_mod(mod_id)}
+
+    def resolve_internal_ids(self, internal_ids):
+        """Maps Group:Name references (as used by save configs) to library mods:
+        {internal_id: {"id", "name", "file_name"}, or None if no library mod provides it}"""
+        result = {}
+        for internal_id in internal_ids:
+            ids = self.store.mods_with_internal_id(internal_id)
+            info = self.store.get_mod(ids[0]) if ids else None
+            result[internal_id] = {"id": ids[0], "name": info.get("name"), "file_name": info.get("file_name")} if info else None
+        return result
+
     def delete_modpack(self, name):
-        # 1. Remove from JSON
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-        
-        new_packs = [p for p in packs if p['name'] != name]
-        
-        with open(self.modpacks_file, 'w') as f:
-            json.dump(new_packs, f)
+        # 1. Remove from the pack list
+        self.store.delete_pack(name)
         
         # 2. Remove Folder
         pack_folder = os.path.join(self.packs_dir, name)
         if os.path.exists(pack_folder):
             shutil.rmtree(pack_folder)
+        map_cache = os.path.join(self.data_dir, "map_cache", name)
+        if os.path.exists(map_cache):
+            shutil.rmtree(map_cache, ignore_errors=True)
+        self.snapshots.prune(name, 0)
             
         # 3. Unset active if needed
         if self.config.get("active_modpack") == name:
@@ -1106,18 +1355,9 @@ class ModManager:
         return {"status": "success"}
 
     def save_modpack(self, name, mod_ids):
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-            
         # Check if updating existing
-        existing = next((p for p in packs if p['name'] == name), None)
-        if existing:
-            existing['mods'] = mod_ids
-        else:
-            packs.append({"name": name, "mods": mod_ids, "created": time.strftime("%Y-%m-%d")})
-        
-        with open(self.modpacks_file, 'w') as f:
-            json.dump(packs, f)
+        if self.store.update_pack(name, lambda p: p.update(mods=mod_ids)) is None:
+            self.store.put_pack({"name": name, "mods": mod_ids, "created": time.strftime("%Y-%m-%d")})
         
         # Create pack folder
         pack_folder = os.path.join(self.packs_dir, name)
@@ -1128,9 +1368,7 @@ class ModManager:
 
     def activate_modpack(self, pack_name):
         """Selection is now instant. Deployment happens at launch_game."""
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-        target_pack = next((p for p in packs if p['name'] == pack_name), None)
+        target_pack = self.store.get_pack(pack_name)
         
         if not target_pack: 
             return {"status": "error", "message": "Modpack not found"}
@@ -1175,6 +1413,288 @@ class ModManager:
 
         return p_upper
 
+    # --- Deployed Mods (manifest) ---
+    def _load_deploy_manifest(self):
+        """What we deployed: {"pack", "dir" (where the tree is now), "entries": {name: entry}}"""
+        try:
+            with open(self.deploy_manifest_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"pack": None, "dir": None, "entries": {}}
+
+    def _save_deploy_manifest(self, manifest):
+        tmp = self.deploy_manifest_file + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.deploy_manifest_file)
+
+    def _deployed_name(self, f_name):
+        """Name of a library file inside the Mods folder (zips are extracted to a folder)"""
+        return os.path.splitext(f_name)[0] if f_name.endswith('.zip') else f_name
+
+    def _remove_path(self, path):
+        if os.path.isdir(path) and not os.path.islink(path): shutil.rmtree(path)
+        elif os.path.lexists(path): os.remove(path)
+
+    def _load_extract_index(self):
+        try:
+            with open(os.path.join(self.extracted_dir, "index.json"), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_extract_index(self, index):
+        os.makedirs(self.extracted_dir, exist_ok=True)
+        path = os.path.join(self.extracted_dir, "index.json")
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, path)
+
+    def _file_sha256(self, path):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def _extracted_mod_dir(self, f_name):
+        """Folder holding the extracted contents of a library zip, keyed by the archive's
+        sha256 (remembered per size/mtime), so each archive is extracted only once"""
+        src = os.path.join(self.library_dir, f_name)
+        st = os.stat(src)
+        with self.extract_lock:
+            index = self._load_extract_index()
+            entry = index.get(f_name)
+        if entry and (entry.get("size"), entry.get("mtime_ns")) == (st.st_size, st.st_mtime_ns):
+            digest = entry["sha256"]
+        else:
+            digest = self._file_sha256(src)
+            with self.extract_lock:
+                index = self._load_extract_index()
+                index[f_name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+                self._save_extract_index(index)
+
+        path = os.path.join(self.extracted_dir, digest)
+        if not os.path.isdir(path):
+            tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+            if os.path.exists(tmp): shutil.rmtree(tmp)
+            try:
+                with zipfile.ZipFile(src, 'r') as z:
+                    z.extractall(tmp)
+            except Exception:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # Someone else finished the same archive first
+                shutil.rmtree(tmp, ignore_errors=True)
+        return path
+
+    def _prune_extracted_mods(self):
+        """Drops extracted trees whose archive is no longer in the library, and partial
+        extractions left by processes that died mid-way"""
+        with self.extract_lock:
+            index = self._load_extract_index()
+            index = {f: e for f, e in index.items() if os.path.exists(os.path.join(self.library_dir, f))}
+            self._save_extract_index(index)
+            live = {e["sha256"] for e in index.values()}
+            for name in os.listdir(self.extracted_dir):
+                if ".tmp" in name:
+                    # Extraction in progress, unless the process that started it is gone
+                    pid = name.rsplit(".tmp", 1)[1].split(".")[0]
+                    if not pid.isdigit() or int(pid) == os.getpid() or psutil.pid_exists(int(pid)): continue
+                path = os.path.join(self.extracted_dir, name)
+                if os.path.isdir(path) and name not in live:
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def _link_file(self, src, dst):
+        """Puts src at dst sharing its data when possible: reflink (btrfs/xfs), then copy.
+        Hardlinks only with mod_link_mode "hardlink": the file would be the cache entry itself,
+        so a mod or the game writing to it in place would corrupt it for every pack.
+        The method that worked is remembered per mode and (source, destination) device pair."""
+        mode = self.config.get("mod_link_mode", "auto")
+        order = LINK_MODES.get(mode, LINK_MODES["auto"])
+        # Keyed on the mode too, so switching it never reuses a method the new mode excludes
+        key = (mode, os.stat(src).st_dev, os.stat(os.path.dirname(dst)).st_dev)
+        known = self._link_methods.get(key)
+        if known in order: order = order[order.index(known):]
+        for method in order:
+            try:
+                if method == "reflink":
+                    if not HAS_FICLONE: continue
+                    with open(src, 'rb') as fs, open(dst, 'wb') as fd:
+                        fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+                    shutil.copystat(src, dst)
+                elif method == "hardlink":
+                    os.link(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+            except OSError:
+                if method == "copy": raise
+                if os.path.lexists(dst): os.remove(dst)
+                continue
+            self._link_methods[key] = method
+            return method
+
+    def _link_tree(self, src_dir, dst_dir):
+        """Recreates src_dir at dst_dir with _link_file; returns {relative path: size}"""
+        files = {}
+        for root, dirs, names in os.walk(src_dir):
+            rel_root = os.path.relpath(root, src_dir)
+            target = dst_dir if rel_root == '.' else os.path.join(dst_dir, rel_root)
+            os.makedirs(target, exist_ok=True)
+            for name in names:
+                self._link_file(os.path.join(root, name), os.path.join(target, name))
+                rel = name if rel_root == '.' else os.path.join(rel_root, name).replace(os.sep, '/')
+                files[rel] = os.path.getsize(os.path.join(root, name))
+        return files
+
+    def _deploy_mod(self, f_name, mods_dir):
+        """Links (or copies) one library file into mods_dir and returns its manifest entry.
+        Zips come from their extracted cache, so they're never decompressed twice."""
+        src = os.path.join(self.library_dir, f_name)
+        st = os.stat(src)
+        dst = os.path.join(mods_dir, self._deployed_name(f_name))
+        self._remove_path(dst)
+        files = {}
+        if f_name.endswith('.zip'):
+            files = self._link_tree(self._extracted_mod_dir(f_name), dst)
+        else:
+            self._link_file(src, dst)
+        return {"source": f_name, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "files": files}
+
+    def _deployed_mod_ok(self, entry, f_name, mods_dir):
+        """True if a manifest entry still matches the library file and what's on disk"""
+        if entry.get("source") != f_name: return False
+        try:
+            st = os.stat(os.path.join(self.library_dir, f_name))
+            if (entry.get("size"), entry.get("mtime_ns")) != (st.st_size, st.st_mtime_ns): return False
+            dst = os.path.join(mods_dir, self._deployed_name(f_name))
+            if not f_name.endswith('.zip'):
+                return os.path.getsize(dst) == st.st_size
+            return all(os.path.getsize(os.path.join(dst, rel)) == size for rel, size in entry.get("files", {}).items())
+        except OSError:
+            return False
+
+    def _get_deploy_workers(self, count):
+        """Threads used to deploy mods (config 'deploy_workers', 0 = auto). Extraction and
+        copying are mostly I/O and zlib, both of which release the GIL."""
+        try:
+            workers = int(self.config.get("deploy_workers", 0))
+        except (TypeError, ValueError):
+            workers = 0
+        if workers <= 0:
+            workers = min(16, (os.cpu_count() or 1) + 4)
+        return max(1, min(workers, count))
+
+    def _sync_deployed_mods(self, pack_name, mods_dir, wanted, errors, callback=None):
+        """Makes mods_dir contain exactly the library files in `wanted`, touching only what
+        differs from the manifest. Anything else in the folder is removed (the user's own
+        mods were stashed before this). Mods that need work are deployed on a thread
+        pool; failures are collected into `errors` instead of stopping the sync."""
+        manifest = self._load_deploy_manifest()
+        entries = manifest.get("entries", {}) if manifest.get("dir") == mods_dir else {}
+        desired = {self._deployed_name(f): f for f in wanted}
+        stats = {"added": 0, "kept": 0, "removed": 0}
+
+        for item in os.listdir(mods_dir):
+            if item not in desired:
+                try:
+                    self._remove_path(os.path.join(mods_dir, item))
+                    stats["removed"] += 1
+                except OSError as e:
+                    errors.append(f"Falha ao remover {item}: {e}")
+
+        new_entries = {}
+        todo = []
+        for name, f_name in desired.items():
+            entry = entries.get(name)
+            if entry and self._deployed_mod_ok(entry, f_name, mods_dir):
+                new_entries[name] = entry
+                stats["kept"] += 1
+            else:
+                todo.append((name, f_name))
+
+        if todo:
+            workers = self._get_deploy_workers(len(todo))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(self._deploy_mod, f_name, mods_dir): (name, f_name) for name, f_name in todo}
+                for i, fut in enumerate(as_completed(futures), 1):
+                    name, f_name = futures[fut]
+                    try:
+                        new_entries[name] = fut.result()
+                        stats["added"] += 1
+                        if callback: callback(f"Implantando mods {i}/{len(todo)}: {name}")
+                    except Exception as e:
+                        errors.append(f"Falha ao implantar {f_name}: {e}")
+                        if callback: callback(f"Implantando mods {i}/{len(todo)}: falha em {name}")
+
+        self._save_deploy_manifest({"pack": pack_name, "dir": mods_dir, "entries": new_entries})
+        # Extractions of archives that were updated or deleted since
+        self._prune_extracted_mods()
+        return stats
+
+    def _unpark_deployed_mods(self, game_mods_dir):
+        """Moves the tree parked by _park_deployed_mods back into the game folder"""
+        manifest = self._load_deploy_manifest()
+        parked = os.path.join(self.deployed_dir, "Mods")
+        if manifest.get("dir") != parked or not os.path.isdir(parked): return
+        try:
+            # The user's own files were stashed; anything left is a leftover of ours
+            self._clear_directory(game_mods_dir)
+            os.rmdir(game_mods_dir)
+            os.rename(parked, game_mods_dir)
+        except OSError as e:
+            print(f"Não foi possível restaurar os mods implantados, reimplantando: {e}")
+            if not os.path.exists(game_mods_dir): os.makedirs(game_mods_dir)
+            return
+        manifest["dir"] = game_mods_dir
+        self._save_deploy_manifest(manifest)
+
+    def _park_deployed_mods(self, game_mods_dir):
+        """Moves our deployed Mods out of the game folder (a rename when on the same disk),
+        leaving it empty for the user's files. Falls back to deleting them."""
+        manifest = self._load_deploy_manifest()
+        parked = os.path.join(self.deployed_dir, "Mods")
+        if manifest.get("dir") == game_mods_dir:
+            try:
+                if os.path.exists(parked): shutil.rmtree(parked)
+                os.rename(game_mods_dir, parked)
+            except OSError as e:
+                print(f"Mods não puderam ser movidos ({e}), limpando pasta.")
+            else:
+                manifest["dir"] = parked
+                self._save_deploy_manifest(manifest)
+                os.makedirs(game_mods_dir)
+                return
+        self._clear_directory(game_mods_dir)
+        if manifest.get("dir") == game_mods_dir:
+            self._save_deploy_manifest({"pack": manifest.get("pack"), "dir": None, "entries": {}})
+
+    def _update_deployed_mods(self, add=(), remove=(), pack_name=None):
+        """Hot add/remove of library files in the current deployment of the active pack
+        (in the game folder during a session, parked otherwise). pack_name=None matches any."""
+        manifest = self._load_deploy_manifest()
+        mods_dir = manifest.get("dir")
+        if not mods_dir or not os.path.isdir(mods_dir): return
+        if pack_name is not None and manifest.get("pack") != pack_name: return
+        entries = manifest.setdefault("entries", {})
+        for f_name in remove:
+            name = self._deployed_name(f_name)
+            try:
+                self._remove_path(os.path.join(mods_dir, name))
+            except OSError as e:
+                print(f"Failed to remove {name}: {e}")
+            entries.pop(name, None)
+        for f_name in add:
+            if not os.path.exists(os.path.join(self.library_dir, f_name)): continue
+            entry = entries.get(self._deployed_name(f_name))
+            if entry and self._deployed_mod_ok(entry, f_name, mods_dir): continue
+            entries[self._deployed_name(f_name)] = self._deploy_mod(f_name, mods_dir)
+        self._save_deploy_manifest(manifest)
+
     def sync_modpack_to_game(self, callback=None):
         """Performs actual file transfers (Mods & Saves) for the active modpack"""
         game_dir = self.config.get("game_dir")
@@ -1189,47 +1709,48 @@ class ModManager:
         game_mods_dir = os.path.join(game_dir, "UserData", "Mods")
         game_saves_dir = self._get_saves_dir(game_dir)
 
-        # 0. Backup current state before anything
-        self._backup_current_game_state(game_mods_dir, game_saves_dir, callback=callback)
+        # 0. Move the user's own files aside before anything
+        self._stash_game_state(game_mods_dir, game_saves_dir, callback=callback)
 
-        # 1. Clear & Deploy Mods (Non-destructive)
-        if callback: callback("Limpando pasta de mods...")
+        # 1. Deploy Mods (Non-destructive): bring back the tree parked after the last
+        # session, then only add/replace/remove what differs from the manifest
         if not os.path.exists(game_mods_dir): os.makedirs(game_mods_dir)
-        self._clear_directory(game_mods_dir)
+        self._unpark_deployed_mods(game_mods_dir)
 
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-        target_pack = next((p for p in packs if p['name'] == pack_name), None)
+        target_pack = self.store.get_pack(pack_name)
         if not target_pack: return {"status": "error", "message": "Pack config gone"}
 
         errors = []
         mods_list = target_pack.get('mods', [])
-        total_mods = len(mods_list)
-        
-        for i, mod_id in enumerate(mods_list):
-            if callback: callback(f"Sincronizando mod {i+1}/{total_mods}...")
-            
+        wanted = []
+        missing = []
+
+        # Resolve from the local library first: launching needs no network unless a
+        # mod's archive is actually missing (updates are a separate, explicit step)
+        lib = self.load_library()
+        for mod_id in mods_list:
+            f_name = self._library_file(mod_id, lib)
+            if f_name:
+                wanted.append(f_name)
+            else:
+                missing.append(mod_id)
+
+        for i, mod_id in enumerate(missing):
+            if callback: callback(f"Baixando mod ausente {i+1}/{len(missing)}...")
+
             res = self.install_mod_to_library(mod_id)
             if res['status'] == 'success' or res['status'] == 'manual_required':
                  f_name = res.get('file_name')
                  if not f_name: continue
-                 
-                 src = os.path.join(self.library_dir, f_name)
-                 dst = os.path.join(game_mods_dir, f_name)
-                 if os.path.exists(src):
-                    if f_name.endswith('.zip'):
-                        extract_to = os.path.join(game_mods_dir, os.path.splitext(f_name)[0])
-                        if os.path.exists(extract_to):
-                            if os.path.isdir(extract_to): shutil.rmtree(extract_to)
-                            else: os.remove(extract_to)
-                        
-                        with zipfile.ZipFile(src, 'r') as z:
-                            z.extractall(extract_to)
-                    else:
-                        shutil.copy2(src, dst)
+                 if os.path.exists(os.path.join(self.library_dir, f_name)):
+                    wanted.append(f_name)
             else:
                 errors.append(f"Mod {mod_id} missing")
 
+        if callback: callback("Atualizando pasta de mods...")
+        stats = self._sync_deployed_mods(pack_name, game_mods_dir, wanted, errors, callback=callback)
+        print(f"Mods: {stats['added']} implantados, {stats['kept']} mantidos, {stats['removed']} removidos")
+
         # 3. Deploy Saves (Non-destructive)
         if self.config.get("manage_saves"):
             if callback: callback("Sincronizando Saves...")
@@ -1252,17 +1773,13 @@ class ModManager:
         return {"status": "success", "errors": errors}
 
     def get_modpack_details(self, pack_name):
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-        
-        target = next((p for p in packs if p['name'] == pack_name), None)
+        target = self.store.get_pack(pack_name)
         if not target: return {"error": "Not found"}
 
-        lib = self.load_library()
         rich_mods = []
         ghost_ids = []
         for mid in target.get('mods', []):
-            info = lib.get(str(mid)) or lib.get(int(mid))
+            info = self.store.get_mod(mid)
             if not info:
                 # Try to heal on the fly
                 info = self.fetch_mod_metadata(mid)
@@ -1276,10 +1793,9 @@ class ModManager:
                     "summary": info.get("summary")
                 })
         if ghost_ids:
-            # Clean up modpacks.json permanently
+            # Clean up the pack permanently
             target['mods'] = [m for m in target['mods'] if m not in ghost_ids]
-            with open(self.modpacks_file, 'w') as f:
-                json.dump(packs, f)
+            self.store.put_pack(target)
             print(f"[Cleanup] Removed {len(ghost_ids)} ghost mods from pack '{pack_name}'")
         
         return {"name": target['name'], "mods": rich_mods, "created": target.get('created')}
@@ -1336,6 +1852,8 @@ class ModManager:
         return {
             "world": world_info,
             "mods": mods_config,
+            # Which library mod each Group:Name entry refers to (None = not installed)
+            "mod_refs": self.resolve_internal_ids(mods_config.keys()),
             "has_preview": has_preview
         }
 
@@ -1381,11 +1899,45 @@ class ModManager:
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    def list_save_snapshots(self, pack_name):
+        return self.snapshots.list(pack_name)
+
+    def create_save_snapshot(self, pack_name, label=""):
+        saves_dir = os.path.join(self.packs_dir, pack_name, "saves")
+        if not os.path.isdir(saves_dir):
+            return {"status": "error", "message": "Este modpack não tem mundos."}
+        try:
+            snap = self.snapshots.create(pack_name, saves_dir, label or "Manual")
+            self.snapshots.prune(pack_name, self.config.get("snapshot_keep", 10))
+            return {"status": "success", "snapshot": snap}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def restore_save_snapshot(self, pack_name, snap_id):
+        """Rolls the pack's saves back to a snapshot, snapshotting the current state first"""
+        if self.is_launching:
+            return {"status": "error", "message": "Feche o jogo antes de restaurar um snapshot."}
+        saves_dir = os.path.join(self.packs_dir, pack_name, "saves")
+        with self.sync_lock:
+            try:
+                protect = {snap_id}
+                if os.path.isdir(saves_dir):
+                    protect.add(self.snapshots.create(pack_name, saves_dir, f"Antes de restaurar {snap_id}")["id"])
+                stats = self.snapshots.restore(pack_name, snap_id, saves_dir)
+                # Neither the snapshot just restored nor the safety copy may be pruned here
+                self.snapshots.prune(pack_name, self.config.get("snapshot_keep", 10), protect=protect)
+            except FileNotFoundError:
+                return {"status": "error", "message": "Snapshot não encontrado."}
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+        return {"status": "success", "message": f"Snapshot restaurado ({stats['written']} arquivos reescritos, {stats['deleted']} removidos)."}
+
     def delete_save(self, pack_name, folder_name):
         save_path = os.path.join(self.packs_dir, pack_name, "saves", folder_name)
         if os.path.exists(save_path):
             try:
                 shutil.rmtree(save_path)
+                shutil.rmtree(self._get_map_cache_dir(pack_name, folder_name), ignore_errors=True)
                 return {"status": "success"}
             except Exception as e:
                 return {"status": "error", "message": str(e)}
@@ -1464,52 +2016,439 @@ class ModManager:
             return {"status": "error", "message": str(e)}
 
     def remove_mod_from_pack(self, pack_name, mod_id):
-        # 1. Update JSON
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-        
-        target = next((p for p in packs if p['name'] == pack_name), None)
-        if not target: return {"status": "error"}
-
         # convert to int/str consistency
         mod_id = int(mod_id)
-        if mod_id in target['mods']:
+
+        # 1. Update the pack
+        def remove(target):
+            if mod_id not in target['mods']: return False
             target['mods'].remove(mod_id)
-        
-        with open(self.modpacks_file, 'w') as f:
-            json.dump(packs, f)
+
+        if self.store.update_pack(pack_name, remove) is None: return {"status": "error"}
 
         # 2. If Active, remove from game folder (Hot Remove)
         if self.config.get("active_modpack") == pack_name:
             # We need the filename.
             info = self.get_mod_info(mod_id)
-            if info:
-                fname = info.get("file_name")
-                game_dir = self.config.get("game_dir")
-                if fname and game_dir:
-                    game_mods_dir = os.path.join(game_dir, "UserData", "Mods")
-                    p = os.path.join(game_mods_dir, fname)
-                    if os.path.exists(p): 
-                        if os.path.isdir(p): shutil.rmtree(p)
-                        else: os.remove(p)
-                    
-                    # Also zip folder if exists (compat with old logic)
-                    pz = os.path.join(game_mods_dir, os.path.splitext(fname)[0])
-                    if os.path.exists(pz): shutil.rmtree(pz)
+            if info and info.get("file_name"):
+                self._update_deployed_mods(remove=[info["file_name"]], pack_name=pack_name)
+
+        return {"status": "success"}
+
+
+    def _get_map_cache_dir(self, pack_name, save_name):
+        """Rendered region tiles live outside the save so they never reach the game folder or exports"""
+        return os.path.join(self.data_dir, "map_cache", pack_name, save_name)
+
+    def _get_map_workers(self, region_count, limit=None):
+        """Number of processes used to decode regions (config 'map_workers', 0 = auto)"""
+        try:
+            workers = int(self.config.get("map_workers", 0))
+        except (TypeError, ValueError):
+            workers = 0
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        if limit:
+            workers = min(workers, limit)
+        return max(1, min(workers, region_count))
+
+    def _find_map_world(self, save_path):
+        """The save's main world: the one with the most region files. Returns (path, count)"""
+        worlds_dir = os.path.join(save_path, "universe", "worlds")
+        target_world = None
+        max_chunks = -1
+        if not os.path.isdir(worlds_dir): return None, 0
+        for w in os.listdir(worlds_dir):
+            w_path = os.path.join(worlds_dir, w)
+            c_path = os.path.join(w_path, "chunks")
+            if os.path.exists(c_path):
+                count = len(os.listdir(c_path))
+                if count > max_chunks:
+                    max_chunks = count
+                    target_world = w_path
+        return target_world, max_chunks
+
+    def _map_is_stale(self, save_path):
+        """True if the save has regions newer than its map_preview.png (or no preview yet)"""
+        world, _ = self._find_map_world(save_path)
+        if not world: return False
+        chunks_dir = os.path.join(world, "chunks")
+        newest = 0
+        with os.scandir(chunks_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".region.bin"):
+                    newest = max(newest, entry.stat().st_mtime_ns)
+        if not newest: return False
+        preview = os.path.join(save_path, "map_preview.png")
+        if not os.path.exists(preview): return True
+        return newest > os.stat(preview).st_mtime_ns
+
+    def render_all_maps(self, force=False, progress_callback=None, cancel_event=None):
+        """Re-renders the map of every save in every pack whose regions changed since its
+        map_preview.png (all of them with force=True). Saves run on a bounded pool of
+        'map_batch_jobs' concurrent renders; each starts its own region worker pool, so the
+        'map_workers' budget is split between them."""
+        queue = []
+        for pack_name in sorted(os.listdir(self.packs_dir)):
+            saves_dir = os.path.join(self.packs_dir, pack_name, "saves")
+            if not os.path.isdir(saves_dir): continue
+            for save_name in sorted(os.listdir(saves_dir)):
+                save_path = os.path.join(saves_dir, save_name)
+                if not os.path.isdir(save_path) or save_name.lower() in ('logs', 'backups', 'backup'): continue
+                try:
+                    if force or self._map_is_stale(save_path):
+                        queue.append((pack_name, save_name))
+                except OSError as e:
+                    logger.warning(f"Skipping {pack_name}/{save_name}: {e}")
+
+        logger.info(f"Batch map render: {len(queue)} save(s) queued")
+        if not queue:
+            return {"status": "success", "rendered": [], "errors": [], "skipped": []}
+
+        # Palettes are shared between renders of a pack: build them once, up front
+        self.build_block_palette(progress_callback=progress_callback)
+        for pack_name in sorted({p for p, _ in queue}):
+            self.build_pack_palette(pack_name, progress_callback=progress_callback)
 
+        try:
+            jobs = int(self.config.get("map_batch_jobs", 2))
+        except (TypeError, ValueError):
+            jobs = 2
+        budget = self._get_map_workers(os.cpu_count() or 1)
+        jobs = max(1, min(jobs, len(queue), budget))
+        per_job_workers = max(1, budget // jobs)
+
+        lock = threading.Lock()
+        state = {"done": 0, "regions": {}}
+        rendered, errors, skipped = [], [], []
+
+        def report():
+            if not progress_callback: return
+            with lock:
+                text = f"Mapas {state['done']}/{len(queue)}"
+                if state["regions"]:
+                    text += " - " + ", ".join(f"{k} ({v})" for k, v in state["regions"].items())
+                progress_callback(text)
+
+        def render(pack_name, save_name):
+            key = f"{pack_name}/{save_name}"
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            def on_event(ev):
+                if ev["type"] == "tile":
+                    with lock:
+                        state["regions"][key] = f"{ev['done']}/{ev['total']}"
+                    report()
+            try:
+                res = self.generate_world_map(pack_name, save_name, event_callback=on_event,
+                                              cancel_event=cancel_event, workers=per_job_workers)
+            except Exception as e:
+                logger.error(f"Batch map render failed for {key}: {e}", exc_info=True)
+                res = {"status": "error", "message": str(e)}
+            with lock:
+                state["regions"].pop(key, None)
+                state["done"] += 1
+                if res.get("status") == "success":
+                    rendered.append(key)
+                elif res.get("status") == "busy":
+                    # Rendered by another job right now; it will be up to date when that finishes
+                    skipped.append(key)
+                elif res.get("status") != "cancelled":
+                    errors.append(f"{key}: {res.get('message', '')}")
+            report()
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for pack_name, save_name in queue:
+                pool.submit(render, pack_name, save_name)
+
+        if cancel_event is not None and cancel_event.is_set():
+            return {"status": "cancelled", "rendered": rendered, "errors": errors, "skipped": skipped}
+        logger.info(f"Batch map render finished: {len(rendered)} rendered, {len(errors)} failed, {len(skipped)} already rendering")
+        return {"status": "success", "rendered": rendered, "errors": errors, "skipped": skipped}
+
+    def start_map_batch(self, event_callback, force=False):
+        """render_all_maps in the background: 'progress' events, then 'done' / 'cancelled' / 'error'.
+        The returned job id can be cancelled with cancel_map_job."""
+        job_id = f"batch/{int(time.time() * 1000)}"
+        cancel_event = threading.Event()
+        with self.map_jobs_lock:
+            self.map_jobs[job_id] = cancel_event
+
+        def run():
+            try:
+                res = self.render_all_maps(
+                    force=force,
+                    progress_callback=lambda msg: event_callback({"type": "progress", "job_id": job_id, "message": msg}),
+                    cancel_event=cancel_event
+                )
+                event_callback({"type": "cancelled" if res["status"] == "cancelled" else "done", "job_id": job_id, "result": res})
+            except Exception as e:
+                logger.error(f"Map batch {job_id} failed: {e}", exc_info=True)
+                event_callback({"type": "error", "job_id": job_id, "message": str(e)})
+            finally:
+                with self.map_jobs_lock:
+                    self.map_jobs.pop(job_id, None)
+
+        threading.Thread(target=run, daemon=True).start()
+        return {"status": "started", "job_id": job_id}
+
+    def start_map_job(self, pack_name, save_name, event_callback):
+        """Runs generate_world_map in the background and streams events to event_callback:
+        'start' (bounds/scale), 'tile' (each finished region), 'progress', then one of
+        'done' / 'cancelled' / 'error'. Returns the job id used by cancel_map_job."""
+        job_id = f"{pack_name}/{save_name}/{int(time.time() * 1000)}"
+        cancel_event = threading.Event()
+        with self.map_jobs_lock:
+            self.map_jobs[job_id] = cancel_event
+
+        def run():
+            try:
+                res = self.generate_world_map(
+                    pack_name, save_name,
+                    progress_callback=lambda msg: event_callback({"type": "progress", "job_id": job_id, "message": msg}),
+                    event_callback=lambda ev: event_callback(dict(ev, job_id=job_id)),
+                    cancel_event=cancel_event
+                )
+                status = res.get('status')
+                if status == 'success':
+                    event_callback({"type": "done", "job_id": job_id, "result": res})
+                elif status == 'cancelled':
+                    event_callback({"type": "cancelled", "job_id": job_id})
+                else:
+                    event_callback({"type": "error", "job_id": job_id, "message": res.get('message', '')})
+            except Exception as e:
+                logger.error(f"Map job {job_id} failed: {e}", exc_info=True)
+                event_callback({"type": "error", "job_id": job_id, "message": str(e)})
+            finally:
+                with self.map_jobs_lock:
+                    self.map_jobs.pop(job_id, None)
+
+        threading.Thread(target=run, daemon=True).start()
+        return {"status": "started", "job_id": job_id}
+
+    def cancel_map_job(self, job_id):
+        with self.map_jobs_lock:
+            cancel_event = self.map_jobs.get(job_id)
+        if not cancel_event:
+            return {"status": "error", "message": "Job not found"}
+        cancel_event.set()
         return {"status": "success"}
 
+    def find_assets_zip(self):
+        """Locates the game's Assets.zip under game_dir (install/<channel>/package/game/latest)"""
+        game_dir = self.config.get("game_dir")
+        if not game_dir or not os.path.exists(game_dir): return None
+        install_dir = os.path.join(game_dir, "install")
+        channels = ["release"] + (sorted(os.listdir(install_dir)) if os.path.isdir(install_dir) else [])
+        for channel in channels:
+            path = os.path.join(install_dir, channel, "package", "game", "latest", "Assets.zip")
+            if os.path.exists(path): return path
+        # Unknown layout: fall back to a shallow search
+        base_depth = game_dir.rstrip(os.sep).count(os.sep)
+        for root, dirs, files in os.walk(game_dir):
+            if "Assets.zip" in files:
+                return os.path.join(root, "Assets.zip")
+            if root.count(os.sep) - base_depth >= 5:
+                dirs[:] = []
+            else:
+                dirs[:] = [d for d in dirs if d not in ("UserData", "Mods", "Saves", "saves")]
+        return None
+
+    def build_block_palette(self, force=False, progress_callback=None):
+        """Builds data/block_colors.json from the block textures in Assets.zip.
+        The archive's size/mtime is recorded next to the palette, so this only does
+        work again after a game update (or with force=True)."""
+        # Concurrent renders (batch + UI) would race on the palette files
+        with self.palette_lock:
+            return self._build_block_palette(force, progress_callback)
+
+    def _build_block_palette(self, force, progress_callback):
+        if not map_renderer.HAS_PIL or not map_renderer.HAS_NUMPY:
+            return {"status": "error", "message": "Pillow and numpy are required"}
+        assets_path = self.find_assets_zip()
+        if not assets_path:
+            return {"status": "error", "message": "Assets.zip não encontrado na pasta do jogo"}
+
+        palette_path = os.path.join(self.data_dir, "block_colors.json")
+        source_path = os.path.join(self.data_dir, "block_colors.source.json")
+        st = os.stat(assets_path)
+        source = {"assets": assets_path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+        if not force and os.path.exists(palette_path) and os.path.exists(source_path):
+            try:
+                with open(source_path, 'r') as f:
+                    if json.load(f) == source:
+                        return {"status": "success", "path": palette_path, "cached": True}
+            except (OSError, ValueError):
+                pass
+
+        if progress_callback: progress_callback("Gerando paleta de cores dos blocos...")
+        logger.info(f"Building block palette from {assets_path}")
+        start = time.time()
+        try:
+            names = map_renderer.list_block_textures(assets_path)
+        except (OSError, zipfile.BadZipFile) as e:
+            logger.error(f"Could not read {assets_path}: {e}")
+            return {"status": "error", "message": f"Assets.zip inválido: {e}"}
+        if not names:
+            return {"status": "error", "message": "Nenhuma textura de bloco encontrada em Assets.zip"}
+
+        # Each worker opens the archive itself and decodes a slice of the textures
+        workers = self._get_map_workers(len(names))
+        batch_size = max(1, -(-len(names) // (workers * 4)))
+        batches = [names[i:i + batch_size] for i in range(0, len(names), batch_size)]
+        colors = {}
+        done = 0
+        if workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(map_renderer.average_texture_colors, assets_path, b) for b in batches]
+                for future in as_completed(futures):
+                    colors.update(future.result())
+                    done += 1
+                    if progress_callback: progress_callback(f"Gerando paleta: {done}/{len(batches)}")
+        else:
+            colors.update(map_renderer.average_texture_colors(assets_path, names))
+
+        # Archive order decides which texture wins when two share a base name
+        palette = {}
+        for name in names:
+            if name in colors:
+                palette[os.path.splitext(os.path.basename(name))[0]] = colors[name]
+
+        tmp_path = palette_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(palette, f, indent=2)
+        os.replace(tmp_path, palette_path)
+        with open(source_path, 'w') as f:
+            json.dump(source, f, indent=2)
+
+        logger.info(f"Block palette built with {len(palette)} entries in {time.time() - start:.1f}s ({workers} workers)")
+        return {"status": "success", "path": palette_path, "entries": len(palette), "cached": False}
+
+    def build_pack_palette(self, pack_name, progress_callback=None):
+        """Vanilla palette plus block textures shipped by the pack's mods.
+        Each archive is scanned once per size/mtime (index in data/mod_palettes.json); the merged
+        palette is written to the pack's map cache only when it differs from vanilla.
+        Returns the palette path to render with."""
+        # mod_palettes.json is shared by every pack
+        with self.palette_lock:
+            return self._build_pack_palette(pack_name, progress_callback)
+
+    def _build_pack_palette(self, pack_name, progress_callback):
+        vanilla_path = os.path.join(self.data_dir, "block_colors.json")
+        index_path = os.path.join(self.data_dir, "mod_palettes.json")
+        pack = self.store.get_pack(pack_name)
+        if not pack: return vanilla_path
+
+        lib = self.load_library()
+        archives = []
+        for mid in pack.get('mods', []):
+            info = lib.get(str(mid)) or {}
+            f_name = info.get('file_name')
+            if not f_name: continue
+            path = os.path.join(self.library_dir, f_name)
+            if os.path.isfile(path) and zipfile.is_zipfile(path):
+                archives.append((f_name, path))
+
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+
+        keys = {}
+        stale = []
+        for f_name, path in archives:
+            st = os.stat(path)
+            keys[f_name] = [st.st_size, st.st_mtime_ns]
+            entry = index.get(f_name)
+            if not entry or entry.get('key') != keys[f_name]:
+                stale.append((f_name, path))
+
+        # Forget archives that left the library
+        pruned = [f_name for f_name in index if not os.path.exists(os.path.join(self.library_dir, f_name))]
+        for f_name in pruned:
+            del index[f_name]
+
+        if stale:
+            if progress_callback: progress_callback(f"Lendo texturas de {len(stale)} mod(s)...")
+            workers = self._get_map_workers(len(stale))
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {pool.submit(map_renderer.mod_texture_colors, path): f_name for f_name, path in stale}
+                    for future in as_completed(futures):
+                        f_name = futures[future]
+                        index[f_name] = {"key": keys[f_name], "colors": future.result()}
+            else:
+                for f_name, path in stale:
+                    index[f_name] = {"key": keys[f_name], "colors": map_renderer.mod_texture_colors(path)}
+            logger.info(f"Scanned {len(stale)} mod archive(s) for block textures")
+
+        if stale or pruned:
+            tmp_path = index_path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+
+        # Mods override vanilla textures of the same name, later mods in the pack win
+        mod_colors = {}
+        for f_name, _ in archives:
+            mod_colors.update(index[f_name]['colors'])
+        if not mod_colors: return vanilla_path
+
+        try:
+            with open(vanilla_path, 'r') as f:
+                palette = json.load(f)
+        except (OSError, ValueError):
+            palette = {}
+        palette.update(mod_colors)
+
+        pack_dir = os.path.join(self.data_dir, "map_cache", pack_name)
+        os.makedirs(pack_dir, exist_ok=True)
+        pack_path = os.path.join(pack_dir, "block_colors.json")
+        # Rewriting an identical file would bump its mtime and recompile the palette for nothing
+        try:
+            with open(pack_path, 'r') as f:
+                if json.load(f) == palette: return pack_path
+        except (OSError, ValueError):
+            pass
+        tmp_path = pack_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(palette, f, indent=2)
+        os.replace(tmp_path, pack_path)
+        logger.info(f"Pack palette for {pack_name}: {len(palette)} entries ({len(mod_colors)} from mods)")
+        return pack_path
+
+    def generate_world_map(self, pack_name, save_name, progress_callback=None, event_callback=None, cancel_event=None, workers=None):
+        """Generates a map preview based on explored chunks and asset colors (Experimental v2).
+        event_callback receives 'start' and per-region 'tile' events for progressive display;
+        setting cancel_event stops the render (finished regions stay cached).
+        workers caps the region worker processes (used by batch renders).
+        Returns status 'busy' if the same save is already being rendered."""
+        key = (pack_name, save_name)
+        with self.map_jobs_lock:
+            if key in self.rendering_saves:
+                logger.info(f"Map of {pack_name}/{save_name} is already being generated")
+                return {"status": "busy", "message": "O mapa deste save já está sendo gerado."}
+            self.rendering_saves.add(key)
+        try:
+            return self._generate_world_map(pack_name, save_name, progress_callback, event_callback, cancel_event, workers)
+        finally:
+            with self.map_jobs_lock:
+                self.rendering_saves.discard(key)
 
-    def generate_world_map(self, pack_name, save_name):
-        """Generates a map preview based on explored chunks and asset colors (Experimental v2)"""
+    def _generate_world_map(self, pack_name, save_name, progress_callback, event_callback, cancel_event, workers):
         logger.info(f"Starting map generation for {pack_name} / {save_name}")
         
-        if not HAS_PIL: 
+        if not map_renderer.HAS_PIL: 
             logger.error("Pillow not installed")
             return {"status": "error", "message": "Pillow not installed"}
-        if not HAS_ZSTD: 
+        if not map_renderer.HAS_ZSTD: 
             logger.error("zstandard not installed")
             return {"status": "error", "message": "zstandard not installed"}
+        if not map_renderer.HAS_NUMPY:
+            logger.error("numpy not installed")
+            return {"status": "error", "message": "numpy not installed"}
             
         save_path = os.path.join(self.packs_dir, pack_name, "saves", save_name)
         worlds_dir = os.path.join(save_path, "universe", "worlds")
@@ -1519,17 +2458,7 @@ class ModManager:
             return {"status": "error", "message": "Save structure invalid (no worlds folder)"}
 
         # Find the main world
-        target_world = None
-        max_chunks = -1
-        
-        for w in os.listdir(worlds_dir):
-            w_path = os.path.join(worlds_dir, w)
-            c_path = os.path.join(w_path, "chunks")
-            if os.path.exists(c_path):
-                count = len(os.listdir(c_path))
-                if count > max_chunks:
-                    max_chunks = count
-                    target_world = w_path
+        target_world, max_chunks = self._find_map_world(save_path)
         
         if not target_world:
              logger.error("No worlds with chunks found")
@@ -1567,220 +2496,193 @@ class ModManager:
 
         logger.info(f"Region Bounds: X({min_x} to {max_x}), Z({min_z} to {max_z})")
 
-        # Canvas Size
-        width_chunks = (max_x - min_x + 1) * 32
-        height_chunks = (max_z - min_z + 1) * 32
-        
-        MAX_RES = 2048
-        scale = 1
-        if width_chunks > MAX_RES or height_chunks > MAX_RES:
-            scale = 32 # effectively 1 pixel per region
-            width_chunks = (max_x - min_x + 1)
-            height_chunks = (max_z - min_z + 1)
-
-        logger.info(f"Map Canvas Size: {width_chunks}x{height_chunks} (Scale: {scale})")
-
-        img = Image.new('RGB', (width_chunks, height_chunks), color=(20, 20, 25))
-        pixels = img.load()
-        
-        # Load palette
-        palette_path = os.path.join(self.data_dir, "block_colors.json")
-        palette = {}
-        if os.path.exists(palette_path):
-            with open(palette_path, 'r') as f:
-                raw_palette = json.load(f)
-                # Ensure all keys are lowercase and values are TUPLES for PIL
-                palette = {k.lower(): tuple(v) for k, v in raw_palette.items()}
-            logger.info(f"Loaded palette with {len(palette)} entries")
-        else:
+        # Load palette (compiled once, reused until block_colors.json changes)
+        res = self.build_block_palette(progress_callback=progress_callback)
+        if res['status'] != 'success':
+            logger.warning(f"Block palette not rebuilt: {res.get('message')}")
+        palette_path = self.build_pack_palette(pack_name, progress_callback=progress_callback)
+        if not os.path.exists(palette_path):
             logger.warning(f"Palette file not found at {palette_path}")
+        palette = map_renderer.load_compiled_palette(palette_path)
+        logger.info(f"Loaded palette with {len(palette)} entries")
+
+        def composite(rx, rz, tile):
+            compositor.add_tile(rx, rz, tile)
+            if event_callback:
+                event_callback({"type": "tile", "rx": rx, "rz": rz, "tile": tile, "done": done + 1, "total": total_regions})
+
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        total_regions = len(valid_regions)
+        done = 0
+        cached = 0
+
+        # Reuse tiles of regions that didn't change since the last render
+        cache = map_renderer.RegionTileCache(
+            self._get_map_cache_dir(pack_name, save_name),
+            palette.fingerprint
+        )
+
+        workers = self._get_map_workers(total_regions, workers)
+        # Started on the first cache miss, so fully cached renders don't spawn processes
+        pool = None
+        use_pool = workers > 1
+        classifier = None
+        in_flight = {}
+        # Enough queued work to keep every worker busy, but no more: out-of-order results
+        # hold their band in memory until the rows above it are done
+        window = workers * 4
+
+        def finish(rx, rz, rf_path, tile, hashes):
+            nonlocal done
+            cache.store(rf_path, tile, hashes)
+            composite(rx, rz, tile)
+            done += 1
+            if progress_callback: progress_callback(f"Renderizando região {done}/{total_regions}...")
+
+        def render_serial(rx, rz, rf_path):
+            nonlocal classifier
+            if classifier is None:
+                classifier = map_renderer.ChunkClassifier(palette)
+            tile, hashes = map_renderer.render_region(rx, rz, rf_path, classifier, cache.previous(rf_path))
+            finish(rx, rz, rf_path, tile, hashes)
+
+        def drain(limit):
+            """Collects pool results until at most `limit` regions are in flight"""
+            nonlocal pool, use_pool
+            try:
+                while len(in_flight) > limit:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        rx, rz, tile, hashes = fut.result()
+                        # Only dropped once it's in, so the fallback below still redoes it on failure
+                        finish(rx, rz, in_flight[fut][2], tile, hashes)
+                        del in_flight[fut]
+            except Exception as e:
+                # e.g. no process support on this platform: finish the rest serially
+                logger.error(f"Map worker pool failed, falling back to serial rendering: {e}")
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = None
+                use_pool = False
+                leftover = list(in_flight.values())
+                in_flight.clear()
+                for region in leftover:
+                    if cancelled(): break
+                    render_serial(*region)
+
+        # The preview is assembled band by band and streamed to disk (see StripCompositor),
+        # so memory doesn't grow with the size of the world
+        MAX_RES = 2048
+        out_path = os.path.join(save_path, "map_preview.png")
+        compositor = None
+        completed = False
+        try:
+            compositor = map_renderer.StripCompositor(out_path, [(rx, rz) for rx, rz, _ in valid_regions], MAX_RES)
+            logger.info(f"Map Canvas Size: {compositor.width}x{compositor.height} (Scale: 1/{compositor.factor})")
+            if event_callback:
+                event_callback({
+                    "type": "start",
+                    "regions": len(valid_regions),
+                    "bounds": [min_x, min_z, max_x, max_z],
+                    "width": compositor.width,
+                    "height": compositor.height,
+                    "factor": compositor.factor
+                })
 
-        # Pre-compute encoded palette keys for faster lookup
-        # Hytale uses Title_Case in NBT (Rock_Bedrock, Ore_Iron_Basalt)
-        # but palette has lowercase keys. We need both versions.
-        palette_keys_encoded = {}
-        for k in palette.keys():
-            # Add lowercase version
-            palette_keys_encoded[k] = k.encode('utf-8')
-            # Add Title_Case version (capitalize each part after _)
-            title_case = '_'.join(word.capitalize() for word in k.split('_'))
-            palette_keys_encoded[k + '_title'] = title_case.encode('utf-8')
-
-        for rx, rz, rf_path in valid_regions:
-            logger.debug(f"Processing region {rx}.{rz}...")
+            for rx, rz, rf_path in sorted(valid_regions, key=lambda r: (r[1], r[0])):
+                if cancelled(): break
+                hit, tile = cache.lookup(rf_path)
+                if hit:
+                    composite(rx, rz, tile)
+                    done += 1
+                    cached += 1
+                    continue
+                if use_pool and pool is None:
+                    try:
+                        pool = ProcessPoolExecutor(max_workers=workers, initializer=map_renderer.init_worker, initargs=(palette,))
+                    except Exception as e:
+                        logger.error(f"Map worker pool unavailable, rendering serially: {e}")
+                        use_pool = False
+                if pool is not None:
+                    drain(window - 1)
+                if pool is not None:
+                    in_flight[pool.submit(map_renderer.render_region_worker, rx, rz, rf_path, cache.previous(rf_path))] = (rx, rz, rf_path)
+                else:
+                    render_serial(rx, rz, rf_path)
+            if pool is not None and not cancelled():
+                drain(0)
+            completed = not cancelled() and compositor.finish()
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            if compositor is not None and not completed:
+                compositor.abort()
+
+        logger.info(f"Rendered {done - cached} of {total_regions} regions ({cached} cached) with {workers} worker(s)")
+
+        if cancelled():
+            # Keep the regions this run didn't reach; the ones it re-rendered stay marked
+            # for the next pyramid build
             try:
-                with open(rf_path, 'rb') as f:
-                    content = f.read()
-                    
-                    table_data = content[40:40+4096]
-                    if len(table_data) < 4096: 
-                        logger.warning(f"Region {rx}.{rz} has truncated header table")
-                        continue
-                    chunk_offsets = struct.unpack('>1024I', table_data)
-                    
-                    valid_offsets = [o for o in chunk_offsets if 0 < o < 1000000]
-                    # Log only if significant
-                    if len(valid_offsets) > 0:
-                        logger.debug(f"Region {rx}.{rz}: Found {len(valid_offsets)} non-zero chunk offsets")
-
-                    dctx = zstd.ZstdDecompressor()
-                    rg_off_x = (rx - min_x) * (32 // scale)
-                    rg_off_z = (rz - min_z) * (32 // scale)
-
-                    # Block priorities for "Top-Down" view (higher = more visible)
-                    PRIORITIES = {
-                        "water": 100, "lava": 99, "snow": 90,
-                        "grass": 85, "vegetation": 84, "flower": 83,
-                        "sand": 75, "gravel": 74,
-                        "leaves": 65, "tree": 64,
-                        "log": 55, "wood": 54,
-                        "ore": 45,
-                        "dirt": 35, "soil": 34,
-                        "clay": 25,
-                        "rock": 15, "stone": 12, "volcanic": 11,
-                        "bedrock": 1
-                    }
+                cache.save(complete=False)
+            except Exception as e:
+                logger.error(f"Could not save map tile cache: {e}")
+            logger.info(f"Map generation cancelled after {done}/{total_regions} regions")
+            return {"status": "cancelled"}
 
-                    for grid_idx, block_idx in enumerate(chunk_offsets):
-                        if block_idx == 0 or block_idx > 1000000: continue
-                        
-                        # CORRECT FORMULA: Sector 0 starts at byte 40 (Table Start)
-                        byte_off = 40 + block_idx * 4096
-                        if byte_off >= len(content): continue
-                        
-                        try:
-                            # Verify ZSTD magic before decompressing
-                            if content[byte_off:byte_off+4] != b'\x28\xb5\x2f\xfd':
-                                # Fallback: Maybe it's at the +8 offset some regions have?
-                                if byte_off + 8 < len(content) and content[byte_off+8:byte_off+12] == b'\x28\xb5\x2f\xfd':
-                                    byte_off += 8
-                                else:
-                                    continue
-                            # We need to decompress. Zstandard can take a larger buffer 
-                            # and will stop at frame end but we specify a max output size
-                            with dctx.stream_reader(io.BytesIO(content[byte_off:])) as reader:
-                                cdata = reader.read(65536)
-                                
-                                # NOVA ABORDAGEM: Buscar diretamente por nomes da paleta
-                                best_color = None
-                                best_priority = -1
-                                match_count = 0
-                                matched_blocks = []
-                                
-                                # Procurar cada nome de bloco da paleta no chunk
-                                for key_name, encoded_key in palette_keys_encoded.items():
-                                    if encoded_key in cdata:
-                                        # Remove suffix '_title' se presente
-                                        palette_key = key_name.replace('_title', '') if '_title' in key_name else key_name
-                                        
-                                        # Evitar contar duplicatas (lowercase + Title_Case do mesmo bloco)
-                                        if palette_key in matched_blocks:
-                                            continue
-                                        matched_blocks.append(palette_key)
-                                        
-                                        match_count += 1
-                                        color_val = palette[palette_key]
-                                        
-                                        if best_color is None:
-                                            best_color = color_val
-                                            
-                                        priority = 20
-                                        for key, p_val in PRIORITIES.items():
-                                            if key in palette_key:
-                                                priority = p_val
-                                                break
-                                        
-                                        if priority > best_priority:
-                                            best_priority = priority
-                                            best_color = color_val
-                                
-                                # Fallback: Se nenhum bloco foi encontrado, usar cinza médio
-                                # (chunks vazios/subterrâneos ou blocos não mapeados)
-                                color = best_color if best_color else (60, 60, 65)
-                                
-                                # Debug logging para primeiros chunks
-                                if grid_idx % 100 == 0 and grid_idx > 0:
-                                    logger.debug(f"Chunk {grid_idx} (Region {rx}.{rz}): Found {match_count} blocks in palette")
-
-                                # Use grid index to calculate relative position within region
-                                # grid_idx is the chunk index within the 32x32 region grid (0-1023)
-                                # Row-major ordering: first 32 chunks are row 0, next 32 are row 1, etc.
-                                local_x = grid_idx % 32   # X position within region (0-31)
-                                local_z = grid_idx // 32  # Z (row) position within region (0-31)
-                                
-                                # Add region offset and scale
-                                px = rg_off_x + (local_x // scale)
-                                pz = rg_off_z + (local_z // scale)
-
-                                # Bounds check
-                                if 0 <= px < width_chunks and 0 <= pz < height_chunks:
-                                    # Ensure color is a tuple of 3 ints
-                                    if isinstance(color, (list, tuple)) and len(color) >= 3:
-                                        pixels[px, pz] = tuple(int(c) for c in color[:3])
-                                    else:
-                                        pixels[px, pz] = (60, 60, 65)
-                        except Exception as e:
-                            if grid_idx == 0: # Only log first error to avoid massive logs if decompression fails
-                                logger.error(f"Decompression error in chunk {grid_idx} of region {rx}.{rz}: {e}")
+        if not completed:
+            # Some band never got all its regions: the old preview stays, nothing counts as done
+            try:
+                cache.save(complete=False)
             except Exception as e:
-                logger.error(f"Error reading region {rx}.{rz}: {e}")
-                continue
+                logger.error(f"Could not save map tile cache: {e}")
+            logger.error(f"Map image incomplete after {done}/{total_regions} regions")
+            return {"status": "error", "message": "Map image incomplete: some regions could not be rendered"}
+
+        # Zoomable tiles for the map viewer (only tiles touching changed regions are redrawn)
+        tiles_meta = None
+        try:
+            if progress_callback: progress_callback("Gerando tiles do mapa...")
+            tiles_meta = map_renderer.build_tile_pyramid(
+                cache,
+                [os.path.basename(rf_path) for _, _, rf_path in valid_regions],
+                os.path.join(self._get_map_cache_dir(pack_name, save_name), "tiles")
+            )
+        except Exception as e:
+            logger.error(f"Error building map tiles: {e}", exc_info=True)
+
+        try:
+            cache.save(pyramid_built=tiles_meta is not None)
+        except Exception as e:
+            logger.error(f"Could not save map tile cache: {e}")
 
-        out_path = os.path.join(save_path, "map_preview.png")
-        final_img = img
-        if width_chunks < 1024:
-             target_w = max(512, width_chunks)
-             target_h = max(512, height_chunks)
-             final_img = img.resize((target_w, target_h), Image.NEAREST)
-        
-        final_img.save(out_path)
         logger.info(f"Map generation finished. Saved to {out_path}")
-        return {"status": "success", "path": out_path}
+        return {"status": "success", "path": out_path, "tiles": tiles_meta}
 
 
     def add_mod_to_pack(self, pack_name, mod_id):
-        # 1. Update JSON
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-        
-        target = next((p for p in packs if p['name'] == pack_name), None)
-        if not target: return {"status": "error", "message": "Pack not found"}
-        
         mod_id = int(mod_id)
-        if mod_id not in target['mods']:
+
+        # 1. Update the pack
+        def add(target):
+            if mod_id in target['mods']: return False
             target['mods'].append(mod_id)
-            with open(self.modpacks_file, 'w') as f:
-                json.dump(packs, f)
+
+        if self.store.update_pack(pack_name, add) is None: return {"status": "error", "message": "Pack not found"}
         
         # 2. If active, deploy
         if self.config.get("active_modpack") == pack_name:
             info = self.get_mod_info(mod_id)
-            if info:
-                f_name = info.get("file_name")
-                game_dir = self.config.get("game_dir")
-                if f_name and game_dir:
-                     game_mods_dir = os.path.join(game_dir, "UserData", "Mods")
-                     if not os.path.exists(game_mods_dir): os.makedirs(game_mods_dir)
-                     
-                     src = os.path.join(self.library_dir, f_name)
-                     dst = os.path.join(game_mods_dir, f_name)
-                     
-                     if os.path.exists(src):
-                        if f_name.endswith('.zip'):
-                            extract_to = os.path.join(game_mods_dir, os.path.splitext(f_name)[0])
-                            if os.path.exists(extract_to):
-                                if os.path.isdir(extract_to): shutil.rmtree(extract_to)
-                                else: os.remove(extract_to)
-                            
-                            with zipfile.ZipFile(src, 'r') as z:
-                                z.extractall(extract_to)
-                        else:
-                            shutil.copy2(src, dst)
+            if info and info.get("file_name"):
+                self._update_deployed_mods(add=[info["file_name"]], pack_name=pack_name)
         return {"status": "success"}
 
     def load_modpacks(self):
-        with open(self.modpacks_file, 'r') as f:
-            return json.load(f)
+        return self.store.load_modpacks()
+
+    def save_modpacks(self, packs):
+        self.store.save_modpacks(packs)
 
     def get_screenshots(self):
         home = os.path.expanduser('~')
@@ -1848,16 +2750,14 @@ class ModManager:
             shutil.move(source_path, dest_path)
             
             # Update Library Metadata
-            lib = self.load_library()
             meta = self.fetch_mod_metadata(mod_id)
             if meta:
-                lib[str(mod_id)] = {
+                self.store.put_mod(mod_id, {
                     "name": meta.get("name", "Unknown"),
                     "logo": meta.get("logo", {}),
                     "summary": meta.get("summary", ""),
                     "file_name": final_file_name
-                }
-                self.save_library(lib)
+                })
             
             # Link to active pack
             active_pack = self.config.get("active_modpack")
@@ -1870,71 +2770,45 @@ class ModManager:
 
     def delete_mods_from_library(self, mod_ids):
         """Batch delete mods from library and all packs"""
-        lib = self.load_library()
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-        
-        game_dir = self.config.get("game_dir")
-        game_mods_dir = os.path.join(game_dir, "UserData", "Mods") if game_dir else None
+        removed_files = []
+        deleted = []
+        ids = {str(m) for m in mod_ids}
         
-        count = 0
-        for mod_id in mod_ids:
-            mod_id_str = str(mod_id)
-            info = lib.get(mod_id_str)
+        for mod_id_str in ids:
+            info = self.store.get_mod(mod_id_str)
             if not info: continue
             
-            # Physical file
+            # Physical file, unless a library entry we keep points at it too
             file_name = info.get("file_name")
-            if file_name:
+            if file_name and set(self.store.mods_with_file(file_name)) <= ids:
                 lib_path = os.path.join(self.library_dir, file_name)
                 if os.path.exists(lib_path): os.remove(lib_path)
-                
-                # Active game path
-                if game_mods_dir:
-                    game_path = os.path.join(game_mods_dir, file_name)
-                    if os.path.exists(game_path): os.remove(game_path)
-            
-            # Remove from library
-            del lib[mod_id_str]
-            
-            # Remove from packs
-            for pack in packs:
-                pack['mods'] = [m for m in pack.get('mods', []) if str(m) != mod_id_str]
-            
-            count += 1
+                removed_files.append(file_name)
+            deleted.append(mod_id_str)
             
-        self.save_library(lib)
-        with open(self.modpacks_file, 'w') as f:
-            json.dump(packs, f)
+        # Library, then only the packs that list them
+        self.store.delete_mods(deleted)
+        self._remove_from_packs(deleted)
+        count = len(deleted)
+
+        # Deployed copies (game folder or parked)
+        if removed_files:
+            self._update_deployed_mods(remove=removed_files)
+            self._prune_extracted_mods()
             
         return {"status": "success", "count": count}
 
     def remove_mods_from_pack(self, pack_name, mod_ids):
         """Batch remove mods from a specific pack"""
-        with open(self.modpacks_file, 'r') as f:
-            packs = json.load(f)
-        
-        target = next((p for p in packs if p['name'] == pack_name), None)
+        mod_ids_set = set(int(m) for m in mod_ids)
+        target = self.store.update_pack(pack_name, lambda p: p.update(mods=[m for m in p['mods'] if int(m) not in mod_ids_set]))
         if not target: return {"status": "error", "message": "Pack not found"}
         
         is_active = (self.config.get("active_modpack") == pack_name)
-        game_dir = self.config.get("game_dir")
-        game_mods_dir = os.path.join(game_dir, "UserData", "Mods") if (is_active and game_dir) else None
-        
-        lib = self.load_library()
-        
-        count = 0
-        mod_ids_set = set(int(m) for m in mod_ids)
-        target['mods'] = [m for m in target['mods'] if int(m) not in mod_ids_set]
-        
-        if game_mods_dir:
-            for mod_id in mod_ids:
-                info = lib.get(str(mod_id))
-                if info and info.get("file_name"):
-                    game_path = os.path.join(game_mods_dir, info.get("file_name"))
-                    if os.path.exists(game_path): os.remove(game_path)
         
-        with open(self.modpacks_file, 'w') as f:
-            json.dump(packs, f)
+        if is_active:
+            infos = [self.store.get_mod(m) or {} for m in mod_ids]
+            files = [info["file_name"] for info in infos if info.get("file_name")]
+            self._update_deployed_mods(remove=files, pack_name=pack_name)
             
         return {"status": "success", "count": len(mod_ids)}
@@ -0,0 +1,18 @@
+"""Headless map refresh: re-renders every save whose regions changed since its last preview.
+
+Usage: python render_maps.py [--force]
+"""
+import sys
+import multiprocessing
+from mod_manager import ModManager
+
+def main():
+    res = ModManager().render_all_maps(force='--force' in sys.argv, progress_callback=print)
+    print(f"{len(res['rendered'])} map(s) rendered, {len(res['errors'])} error(s)")
+    for err in res['errors']:
+        print(f"  {err}")
+    return 1 if res['errors'] else 0
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
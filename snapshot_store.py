@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import zlib
+
+try:
+    import zstandard as zstd
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+# Fixed-size chunks, a multiple of the region sector size: the game rewrites region
+# chunks in place, so an edit only changes the 256 KB blocks it touches
+CHUNK_SIZE = 256 * 1024
+ZSTD_LEVEL = 3
+
+# One-byte codec tag in front of every stored object
+CODEC_ZSTD = b'Z'
+CODEC_ZLIB = b'z'
+
+
+def _id_order(snap_id):
+    """Sort key for ids: YYYYmmdd-HHMMSS, then the same-second counter (-2, -3, ... -10)
+    numerically, which plain string order gets wrong"""
+    base, n = snap_id[:15], snap_id[16:]
+    return base, int(n) if n.isdigit() else 1
+
+
+class SnapshotStore:
+    """Content-addressed snapshots of save folders.
+
+    Files are split into CHUNK_SIZE blocks stored once under objects/<hash[:2]>/<hash>
+    (sha256 of the raw block, zstd-compressed), so snapshots of a world that barely
+    changed share almost all of their data. Each snapshot is a JSON manifest under
+    scopes/<scope>/<id>.json listing every file's size, mtime and block hashes.
+    Files whose size and mtime match the previous snapshot reuse its block list
+    without being read again."""
+
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.scopes_dir = os.path.join(root, "scopes")
+        self.lock = threading.Lock()
+
+    # --- Objects ---
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _compress(self, data):
+        if HAS_ZSTD:
+            return CODEC_ZSTD + zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        return CODEC_ZLIB + zlib.compress(data, 6)
+
+    def _decompress(self, blob):
+        codec, payload = blob[:1], blob[1:]
+        if codec == CODEC_ZSTD:
+            if not HAS_ZSTD: raise RuntimeError("zstandard não está instalado")
+            return zstd.ZstdDecompressor().decompress(payload)
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(payload)
+        raise ValueError(f"Codec desconhecido: {codec!r}")
+
+    def _put(self, data):
+        """Stores a block if it isn't there yet; returns (digest, bytes written)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path): return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        blob = self._compress(data)
+        tmp = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp, path)
+        return digest, len(blob)
+
+    def _get(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            return self._decompress(f.read())
+
+    # --- Manifests ---
+    def _scope_dir(self, scope):
+        return os.path.join(self.scopes_dir, scope)
+
+    def _load(self, scope, snap_id):
+        with open(os.path.join(self._scope_dir(scope), f"{snap_id}.json"), 'r') as f:
+            return json.load(f)
+
+    def _ids(self, scope):
+        """Snapshot ids, oldest first"""
+        path = self._scope_dir(scope)
+        if not os.path.isdir(path): return []
+        return sorted((n[:-5] for n in os.listdir(path) if n.endswith(".json")), key=_id_order)
+
+    def list(self, scope):
+        """Snapshots of a scope, newest first, without their file lists"""
+        result = []
+        for snap_id in reversed(self._ids(scope)):
+            try:
+                manifest = self._load(scope, snap_id)
+            except (OSError, ValueError):
+                continue
+            result.append({k: v for k, v in manifest.items() if k != "files"})
+        return result
+
+    def create(self, scope, src_dir, label=""):
+        """Snapshots src_dir; returns the manifest summary (files, size, stored bytes)"""
+        with self.lock:
+            ids = self._ids(scope)
+            previous = {}
+            if ids:
+                try:
+                    previous = self._load(scope, ids[-1]).get("files", {})
+                except (OSError, ValueError):
+                    previous = {}
+
+            files = {}
+            dirs = []
+            stored = 0
+            for root, dirnames, names in os.walk(src_dir):
+                rel_root = os.path.relpath(root, src_dir)
+                for name in dirnames:
+                    dirs.append(name if rel_root == '.' else os.path.join(rel_root, name).replace(os.sep, '/'))
+                for name in names:
+                    path = os.path.join(root, name)
+                    rel = name if rel_root == '.' else os.path.join(rel_root, name).replace(os.sep, '/')
+                    st = os.stat(path)
+                    old = previous.get(rel)
+                    if old and (old["size"], old["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+                        files[rel] = old
+                        continue
+                    chunks = []
+                    with open(path, 'rb') as f:
+                        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            digest, written = self._put(block)
+                            chunks.append(digest)
+                            stored += written
+                    files[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "chunks": chunks}
+
+            # Ids must sort after every existing one, even when older ids of this second
+            # were pruned (or the clock went back)
+            base = time.strftime("%Y%m%d-%H%M%S")
+            if ids: base = max(base, ids[-1][:15])
+            snap_id = base
+            n = 2
+            while ids and _id_order(snap_id) <= _id_order(ids[-1]):
+                snap_id = f"{base}-{n}"
+                n += 1
+            manifest = {
+                "id": snap_id,
+                "created": time.time(),
+                "label": label,
+                "files": files,
+                "dirs": dirs,
+                "file_count": len(files),
+                "size": sum(e["size"] for e in files.values()),
+                "stored": stored
+            }
+            os.makedirs(self._scope_dir(scope), exist_ok=True)
+            path = os.path.join(self._scope_dir(scope), f"{snap_id}.json")
+            with open(path + ".tmp", 'w') as f:
+                json.dump(manifest, f)
+            os.replace(path + ".tmp", path)
+            return {k: v for k, v in manifest.items() if k != "files"}
+
+    def restore(self, scope, snap_id, dst_dir):
+        """Makes dst_dir match a snapshot: files with the snapshot's size and mtime are
+        left alone, the rest are rebuilt from their blocks, and extra files are removed.
+        Returns {"written", "kept", "deleted"}."""
+        with self.lock:
+            manifest = self._load(scope, snap_id)
+        files = manifest.get("files", {})
+        stats = {"written": 0, "kept": 0, "deleted": 0}
+        os.makedirs(dst_dir, exist_ok=True)
+
+        for rel in manifest.get("dirs", []):
+            path = os.path.join(dst_dir, rel)
+            if os.path.lexists(path) and not os.path.isdir(path): os.remove(path)
+            os.makedirs(path, exist_ok=True)
+
+        for rel, entry in files.items():
+            path = os.path.join(dst_dir, rel)
+            try:
+                st = os.stat(path)
+                if (st.st_size, st.st_mtime_ns) == (entry["size"], entry["mtime_ns"]) and os.path.isfile(path):
+                    stats["kept"] += 1
+                    continue
+            except FileNotFoundError:
+                pass
+            if os.path.isdir(path) and not os.path.islink(path): shutil.rmtree(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".nexsnap"
+            with open(tmp, 'wb') as f:
+                for digest in entry["chunks"]:
+                    f.write(self._get(digest))
+            os.utime(tmp, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+            os.replace(tmp, path)
+            stats["written"] += 1
+
+        # Remove whatever the snapshot doesn't have, deepest paths first
+        keep_dirs = set(manifest.get("dirs", []))
+        for root, dirnames, names in os.walk(dst_dir, topdown=False):
+            rel_root = os.path.relpath(root, dst_dir)
+            for name in names:
+                rel = name if rel_root == '.' else os.path.join(rel_root, name).replace(os.sep, '/')
+                if rel not in files:
+                    os.remove(os.path.join(root, name))
+                    stats["deleted"] += 1
+            for name in dirnames:
+                rel = name if rel_root == '.' else os.path.join(rel_root, name).replace(os.sep, '/')
+                path = os.path.join(root, name)
+                if rel not in keep_dirs:
+                    if os.path.islink(path): os.remove(path)
+                    else: shutil.rmtree(path)
+                    stats["deleted"] += 1
+        return stats
+
+    def delete(self, scope, snap_id):
+        with self.lock:
+            path = os.path.join(self._scope_dir(scope), f"{snap_id}.json")
+            if os.path.exists(path): os.remove(path)
+
+    def prune(self, scope, keep, protect=()):
+        """Keeps the `keep` newest snapshots of a scope (none for keep=0) plus the ids in
+        `protect`, then drops unreferenced blocks"""
+        ids = [i for i in self._ids(scope) if i not in protect]
+        for snap_id in ids[:-keep] if keep > 0 else ids:
+            self.delete(scope, snap_id)
+        return self.gc()
+
+    def gc(self):
+        """Deletes blocks no snapshot references; returns the number removed"""
+        with self.lock:
+            live = set()
+            if os.path.isdir(self.scopes_dir):
+                for scope in os.listdir(self.scopes_dir):
+                    for snap_id in self._ids(scope):
+                        try:
+                            manifest = self._load(scope, snap_id)
+                        except (OSError, ValueError):
+                            # Can't tell what it references; keep everything
+                            return 0
+                        for entry in manifest.get("files", {}).values():
+                            live.update(entry["chunks"])
+            removed = 0
+            if not os.path.isdir(self.objects_dir): return 0
+            for prefix in os.listdir(self.objects_dir):
+                folder = os.path.join(self.objects_dir, prefix)
+                for name in os.listdir(folder):
+                    if name not in live:
+                        os.remove(os.path.join(folder, name))
+                        removed += 1
+                if not os.listdir(folder): os.rmdir(folder)
+            return removed
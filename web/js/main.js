@@ -576,9 +576,14 @@ function startManualDownloadAssistant(data, btn, originalText) {
 /**
  * Progress Modal Management
  */
-function showProgressModal(title, status = "Iniciando...") {
+function showProgressModal(title, status = "Iniciando...", onCancel = null) {
     document.getElementById('progress-modal-title').innerText = title;
     document.getElementById('progress-modal-status').innerText = status;
+    // Cancel button only for jobs that can be stopped
+    const cancelBtn = document.getElementById('progress-modal-cancel');
+    cancelBtn.style.display = onCancel ? 'block' : 'none';
+    cancelBtn.disabled = false;
+    cancelBtn.onclick = onCancel;
     document.getElementById('progress-modal-overlay').style.display = 'flex';
 }
 
@@ -589,6 +594,7 @@ function updateProgress(status) {
 
 function hideProgressModal() {
     document.getElementById('progress-modal-overlay').style.display = 'none';
+    document.getElementById('progress-modal-cancel').style.display = 'none';
 }
 
 // Make globally accessible for Python callbacks
@@ -863,6 +869,40 @@ function renderSaves(saves) {
     });
 }
 
+async function openSnapshots() {
+    const packName = window.currentPackName;
+    try {
+        const snaps = await window.pywebview.api.list_save_snapshots_py(packName);
+        if (snaps.length === 0) {
+            await alertApp("Nenhum snapshot ainda. Eles são criados ao fim de cada sessão de jogo.", "Snapshots");
+            return;
+        }
+
+        const lines = snaps.map((s, i) => {
+            const date = new Date(s.created * 1000).toLocaleString('pt-BR');
+            return `${i + 1}. ${date} - ${s.label} (${(s.size / 1e6).toFixed(1)} MB, +${(s.stored / 1e6).toFixed(1)} MB)`;
+        }).join("\n");
+        const choice = await showAppModal('prompt', "Snapshots", `${lines}\n\nNúmero do snapshot a restaurar:`);
+        if (choice === null || choice === '') return;
+
+        const snap = snaps[parseInt(choice, 10) - 1];
+        if (!snap) {
+            await alertApp("Número inválido.");
+            return;
+        }
+        if (!(await confirmApp(`Restaurar os mundos para ${snap.id}? O estado atual será guardado em um novo snapshot.`))) return;
+
+        showProgressModal("Snapshots", "Restaurando mundos...");
+        const res = await window.pywebview.api.restore_save_snapshot_py(packName, snap.id);
+        hideProgressModal();
+        await alertApp(res.message, "Snapshots");
+        loadSaves(packName);
+    } catch (e) {
+        hideProgressModal();
+        await alertApp("Erro: " + e);
+    }
+}
+
 /**
  * Save Editor Logic
  */
@@ -890,6 +930,8 @@ async function openSaveEditor(saveData = null) {
         const packDetails = await window.pywebview.api.get_modpack_details_py(window.currentPackName);
         list.innerHTML = '';
 
+        const packKeys = new Set(packDetails.mods.map(mod => mod.internal_id || mod.name));
+
         packDetails.mods.forEach(mod => {
             const modKey = mod.internal_id || mod.name;
             const isEnabled = saveData ? (saveData.mods[modKey]?.Enabled !== false) : true;
@@ -904,6 +946,23 @@ async function openSaveEditor(saveData = null) {
             `;
             list.appendChild(item);
         });
+
+        // Entries of the save's config that aren't in the pack stay listed, so saving keeps them
+        if (saveData) {
+            Object.keys(saveData.mods).filter(key => !packKeys.has(key)).forEach(key => {
+                const ref = saveData.mod_refs ? saveData.mod_refs[key] : null;
+                const label = ref ? `${ref.name} (fora do pack)` : `${key} (não instalado)`;
+                const item = document.createElement('div');
+                item.style.display = 'flex';
+                item.style.alignItems = 'center';
+                item.style.gap = '10px';
+                item.innerHTML = `
+                    <input type="checkbox" class="save-mod-toggle" data-mod-id="${key}" ${saveData.mods[key]?.Enabled !== false ? 'checked' : ''} style="width:16px; height:16px;">
+                    <span style="font-size:0.9rem; color:var(--text-secondary)">${label}</span>
+                `;
+                list.appendChild(item);
+            });
+        }
     } catch (e) {
         list.innerHTML = 'Erro ao carregar mods do pacote.';
     }
@@ -913,6 +972,7 @@ async function openSaveEditor(saveData = null) {
 
 function closeSaveEditor() {
     document.getElementById('save-editor-modal').style.display = 'none';
+    if (currentMapJob) window.pywebview.api.cancel_map_py(currentMapJob);
 }
 
 async function confirmSaveConfig() {
@@ -1163,8 +1223,42 @@ async function loadLibrary() {
     }
 }
 
+async function checkModUpdates() {
+    showProgressModal("Atualizações", "Consultando o CurseForge...");
+    try {
+        const res = await window.pywebview.api.check_mod_updates_py();
+        hideProgressModal();
+        if (res.status !== 'success') {
+            await alertApp("Erro: " + res.message);
+            return;
+        }
+        if (res.updates.length === 0) {
+            await alertApp(`Todos os ${res.checked} mods estão atualizados.`, "Atualizações");
+            return;
+        }
+
+        const list = res.updates.map(u => `• ${u.name}: ${u.current || '(ausente)'} → ${u.latest}`).join("\n");
+        if (!(await confirmApp(`${res.updates.length} atualização(ões) disponível(is):\n\n${list}\n\nAtualizar agora?`, "Atualizações"))) return;
+
+        showProgressModal("Atualizações", "Baixando mods...");
+        const upd = await window.pywebview.api.update_mods_py(res.updates.map(u => u.mod_id));
+        hideProgressModal();
+
+        let msg = `${upd.updated.length} mod(s) atualizado(s).`;
+        if (upd.manual.length) msg += "\n\nDownload manual necessário:\n" + upd.manual.map(m => m.file_name).join("\n");
+        if (upd.errors.length) msg += "\n\nFalhas:\n" + upd.errors.join("\n");
+        await alertApp(msg, "Atualizações");
+        loadLibrary();
+    } catch (e) {
+        hideProgressModal();
+        await alertApp("Erro de comunicação: " + e);
+    }
+}
+
 async function deleteModFromLibrary(id, name) {
-    if (!(await confirmApp(`Tem certeza que deseja remover o mod "${name}"? Ele será removido de TODOS os seus modpacks.`))) return;
+    const usage = await window.pywebview.api.get_mod_usage_py(id);
+    const where = usage.packs.length ? ` Ele será removido de: ${usage.packs.join(', ')}.` : ' Nenhum modpack usa este mod.';
+    if (!(await confirmApp(`Tem certeza que deseja remover o mod "${name}"?${where}`))) return;
 
     try {
         const res = await window.pywebview.api.delete_mod_from_library_py(id);
@@ -1497,33 +1591,288 @@ async function saveSettings() {
     }
 }
 
+let currentMapJob = null;
+let progressiveMap = null;
+const MAP_BUTTON_HTML = '<i class="fa-solid fa-map"></i> Gerar Mapa (Experimental)';
+
 async function previewWorldMap() {
     if (!editingSave || !window.currentPackName) return;
 
     const btn = document.querySelector('button[onclick="previewWorldMap()"]');
-    const originalText = btn.innerHTML;
-    btn.innerHTML = '<i class="fa-solid fa-spinner fa-spin"></i> Gerando...';
-    btn.disabled = true;
 
-    try {
-        const res = await window.pywebview.api.generate_map_py(window.currentPackName, editingSave.folder_name);
+    // While a render is running the same button cancels it
+    if (currentMapJob) {
+        btn.disabled = true;
+        await window.pywebview.api.cancel_map_py(currentMapJob);
+        return;
+    }
 
-        if (res.status === 'success') {
-            const container = document.getElementById('map-preview-container');
-            const img = document.getElementById('map-preview-img');
-            // Add timestamp to bypass cache
-            img.src = res.url + '?t=' + new Date().getTime();
+    btn.innerHTML = '<i class="fa-solid fa-xmark"></i> Cancelar (0%)';
+    const container = document.getElementById('map-preview-container');
+    const status = document.getElementById('map-progress-status');
+    status.innerText = 'Lendo regiões do mundo...';
+    status.style.display = 'block';
+
+    try {
+        const res = await window.pywebview.api.start_map_py(window.currentPackName, editingSave.folder_name);
+        if (res.status === 'started') {
+            currentMapJob = res.job_id;
             container.style.display = 'block';
         } else {
+            finishMapJob();
             await alertApp("Erro ao gerar mapa: " + res.message);
         }
     } catch (e) {
+        finishMapJob();
         console.error(e);
         await alertApp("Erro: " + e);
-    } finally {
-        btn.innerHTML = originalText;
+    }
+}
+
+function finishMapJob() {
+    currentMapJob = null;
+    progressiveMap = null;
+    const btn = document.querySelector('button[onclick="previewWorldMap()"]');
+    if (btn) {
+        btn.innerHTML = MAP_BUTTON_HTML;
         btn.disabled = false;
     }
+    const status = document.getElementById('map-progress-status');
+    if (status) status.style.display = 'none';
+}
+
+/**
+ * Progressive map: regions are drawn as the background job finishes them
+ */
+async function onMapJobEvent(ev) {
+    if (!currentMapJob || ev.job_id !== currentMapJob) return;
+
+    const btn = document.querySelector('button[onclick="previewWorldMap()"]');
+    const status = document.getElementById('map-progress-status');
+    const canvas = document.getElementById('map-progress-canvas');
+    const img = document.getElementById('map-preview-img');
+
+    if (ev.type === 'start') {
+        document.getElementById('map-viewer').style.display = 'none';
+        img.style.display = 'none';
+        canvas.width = ev.width;
+        canvas.height = ev.height;
+        canvas.style.display = 'block';
+        const ctx = canvas.getContext('2d');
+        ctx.fillStyle = 'rgb(20, 20, 25)';
+        ctx.fillRect(0, 0, ev.width, ev.height);
+
+        const scratch = document.createElement('canvas');
+        scratch.width = 32;
+        scratch.height = 32;
+        progressiveMap = { ctx, scratch, minX: ev.bounds[0], minZ: ev.bounds[1], size: 32 / ev.factor };
+    } else if (ev.type === 'tiles' && progressiveMap) {
+        const { ctx, scratch, minX, minZ, size } = progressiveMap;
+        const sctx = scratch.getContext('2d');
+        for (const [rx, rz, b64] of ev.tiles) {
+            const raw = atob(b64);
+            const data = new Uint8ClampedArray(raw.length);
+            for (let i = 0; i < raw.length; i++) data[i] = raw.charCodeAt(i);
+            sctx.clearRect(0, 0, 32, 32);
+            sctx.putImageData(new ImageData(data, 32, 32), 0, 0);
+            ctx.drawImage(scratch, (rx - minX) * size, (rz - minZ) * size, size, size);
+        }
+        btn.innerHTML = `<i class="fa-solid fa-xmark"></i> Cancelar (${ev.percent}%)`;
+        status.innerText = ev.message || `Renderizando região ${ev.done}/${ev.total}...`;
+    } else if (ev.type === 'progress') {
+        status.innerText = ev.message;
+    } else if (ev.type === 'done') {
+        const res = ev.result;
+        canvas.style.display = 'none';
+        if (res.tiles) {
+            img.style.display = 'none';
+            openMapViewer(window.currentPackName, editingSave.folder_name, res.tiles);
+        } else {
+            // Add timestamp to bypass cache
+            img.src = res.url + '?t=' + new Date().getTime();
+            img.style.display = '';
+        }
+        finishMapJob();
+    } else if (ev.type === 'cancelled') {
+        finishMapJob();
+    } else if (ev.type === 'error') {
+        canvas.style.display = 'none';
+        finishMapJob();
+        await alertApp("Erro ao gerar mapa: " + ev.message);
+    }
+}
+
+// Called from Python (Api.start_map_py)
+window.onMapJobEvent = onMapJobEvent;
+
+let currentMapBatch = null;
+
+async function cancelMapBatch() {
+    if (!currentMapBatch) return;
+    document.getElementById('progress-modal-cancel').disabled = true;
+    updateProgress("Cancelando...");
+    await window.pywebview.api.cancel_map_py(currentMapBatch);
+}
+
+async function renderAllMaps() {
+    // null while starting, the job id while running, false once it has finished
+    currentMapBatch = null;
+    showProgressModal("Atualizando mapas", "Procurando saves alterados...", cancelMapBatch);
+    try {
+        const res = await window.pywebview.api.start_map_batch_py(false);
+        // A fast batch may have finished (and reported) before this returns
+        if (res.status === 'started' && currentMapBatch !== false) currentMapBatch = res.job_id;
+    } catch (e) {
+        hideProgressModal();
+        await alertApp("Erro: " + e);
+    }
+}
+
+async function onMapBatchEvent(ev) {
+    if (ev.type === 'progress') {
+        currentMapBatch = ev.job_id;
+        updateProgress(ev.message);
+        return;
+    }
+    currentMapBatch = false;
+    hideProgressModal();
+    if (ev.type === 'error') {
+        await alertApp("Erro ao gerar mapas: " + ev.message);
+        return;
+    }
+    const res = ev.result;
+    let msg = res.rendered.length ? `${res.rendered.length} mapa(s) atualizado(s).` : "Todos os mapas já estão atualizados.";
+    if (ev.type === 'cancelled') msg = `Atualização cancelada. ${res.rendered.length} mapa(s) atualizado(s).`;
+    if (res.skipped && res.skipped.length) msg += `\n\nJá em geração: ${res.skipped.join(", ")}`;
+    if (res.errors.length) msg += "\n\nFalhas:\n" + res.errors.join("\n");
+    await alertApp(msg, "Mapas");
+}
+
+// Called from Python (Api.start_map_batch_py)
+window.onMapBatchEvent = onMapBatchEvent;
+
+/**
+ * Zoomable Map Viewer (tile pyramid served from /map-tiles/)
+ * Only tiles intersecting the viewport are requested.
+ */
+let mapViewer = null;
+
+function openMapViewer(packName, folderName, meta) {
+    const el = document.getElementById('map-viewer');
+    el.style.display = 'block';
+    el.innerHTML = '';
+
+    const base = `/map-tiles/${encodeURIComponent(packName)}/${encodeURIComponent(folderName)}`;
+    const [minX, minZ, maxX, maxZ] = meta.bounds;
+    const width = el.clientWidth || 600;
+    const height = el.clientHeight || 420;
+
+    mapViewer = {
+        el, base, meta,
+        tiles: new Map(),
+        // View state: chunk at the viewport center and screen pixels per chunk
+        centerX: (minX + maxX) / 2,
+        centerZ: (minZ + maxZ) / 2,
+        scale: Math.min(width / (maxX - minX), height / (maxZ - minZ)),
+        drag: null
+    };
+
+    if (!el.dataset.bound) {
+        el.dataset.bound = '1';
+        el.addEventListener('wheel', onMapWheel, { passive: false });
+        el.addEventListener('pointerdown', onMapPointerDown);
+        window.addEventListener('pointermove', onMapPointerMove);
+        window.addEventListener('pointerup', onMapPointerUp);
+    }
+    renderMapTiles();
+}
+
+function renderMapTiles() {
+    const v = mapViewer;
+    if (!v) return;
+    const { meta, el } = v;
+    const width = el.clientWidth;
+    const height = el.clientHeight;
+
+    // Pick the pyramid level closest to the current scale (1 px per chunk at max_zoom)
+    let z = meta.max_zoom + Math.round(Math.log2(v.scale));
+    z = Math.max(meta.min_zoom, Math.min(meta.max_zoom, z));
+    const span = meta.tile_size * Math.pow(2, meta.max_zoom - z); // chunks per tile
+    const tilePx = span * v.scale;
+
+    const left = v.centerX - width / 2 / v.scale;
+    const top = v.centerZ - height / 2 / v.scale;
+    const x0 = Math.floor((left - meta.origin[0]) / span);
+    const y0 = Math.floor((top - meta.origin[1]) / span);
+    const x1 = Math.floor((left + width / v.scale - meta.origin[0]) / span);
+    const y1 = Math.floor((top + height / v.scale - meta.origin[1]) / span);
+    const maxIdx = Math.pow(2, z) - 1;
+
+    const visible = new Set();
+    for (let x = Math.max(0, x0); x <= Math.min(maxIdx, x1); x++) {
+        for (let y = Math.max(0, y0); y <= Math.min(maxIdx, y1); y++) {
+            const key = `${z}/${x}/${y}`;
+            visible.add(key);
+            let img = v.tiles.get(key);
+            if (!img) {
+                img = document.createElement('img');
+                img.onerror = () => { img.style.display = 'none'; }; // Unexplored tile
+                img.src = `${v.base}/${key}.png?v=${meta.version}`;
+                v.tiles.set(key, img);
+                el.appendChild(img);
+            }
+            img.style.left = ((meta.origin[0] + x * span - left) * v.scale) + 'px';
+            img.style.top = ((meta.origin[1] + y * span - top) * v.scale) + 'px';
+            img.style.width = tilePx + 'px';
+            img.style.height = tilePx + 'px';
+        }
+    }
+
+    // Drop tiles that left the viewport (or belong to another zoom level)
+    for (const [key, img] of v.tiles) {
+        if (!visible.has(key)) {
+            img.remove();
+            v.tiles.delete(key);
+        }
+    }
+}
+
+function onMapWheel(e) {
+    if (!mapViewer) return;
+    e.preventDefault();
+    const v = mapViewer;
+    const rect = v.el.getBoundingClientRect();
+    const mx = e.clientX - rect.left - rect.width / 2;
+    const my = e.clientY - rect.top - rect.height / 2;
+
+    // Zoom around the cursor
+    const factor = e.deltaY < 0 ? 1.25 : 0.8;
+    const newScale = Math.max(Math.pow(2, -v.meta.max_zoom - 1), Math.min(16, v.scale * factor));
+    v.centerX += mx / v.scale - mx / newScale;
+    v.centerZ += my / v.scale - my / newScale;
+    v.scale = newScale;
+    renderMapTiles();
+}
+
+function onMapPointerDown(e) {
+    if (!mapViewer) return;
+    mapViewer.drag = { x: e.clientX, y: e.clientY };
+    mapViewer.el.classList.add('dragging');
+}
+
+function onMapPointerMove(e) {
+    if (!mapViewer || !mapViewer.drag) return;
+    const v = mapViewer;
+    v.centerX -= (e.clientX - v.drag.x) / v.scale;
+    v.centerZ -= (e.clientY - v.drag.y) / v.scale;
+    v.drag = { x: e.clientX, y: e.clientY };
+    renderMapTiles();
+}
+
+function onMapPointerUp() {
+    if (!mapViewer || !mapViewer.drag) return;
+    mapViewer.drag = null;
+    mapViewer.el.classList.remove('dragging');
 }
 
 /**